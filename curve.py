@@ -0,0 +1,135 @@
+'''
+   Incremental learning curve engine
+   Name:         curve.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import os
+import shutil
+import multiprocessing
+
+from revision import *
+from tboostsrl import tboostsrl
+
+class curve:
+    def get_pool(processes):
+        '''Pool of worker processes forked from this one.
+        The drivers run at module level without a __main__ guard, so workers
+        must not be started by spawn or forkserver, which import them again.'''
+        return multiprocessing.get_context('fork').Pool(processes=processes)
+
+    def get_fractions(examples, amounts):
+        '''Nested prefixes of examples, one for each amount of data.
+        Each fraction is a superset of the previous one.'''
+        return [list(examples[:int(amount * len(examples))]) for amount in amounts]
+
+    def share_facts(workspace, train_facts, test_facts):
+        '''Write train and test facts of a fold once to be linked by every job'''
+        os.makedirs(workspace, exist_ok=True)
+        train = tboostsrl.facts_file(train_facts, os.path.join(workspace, 'train_facts.txt'))
+        if test_facts is train_facts:
+            return (train, train)
+        test = tboostsrl.facts_file(test_facts, os.path.join(workspace, 'test_facts.txt'))
+        return (train, test)
+
+    def get_jobs(methods, amounts, warm_start=False):
+        '''Schedule (method, amounts) jobs.
+        Without warm start every amount of every method is independent,
+        otherwise each method is a chain where an amount starts from the
+        model learned with the previous amount.'''
+        if warm_start:
+            return [(method, list(amounts)) for method in methods]
+        return [(method, [amount]) for method in methods for amount in amounts]
+
+    def run_job(job):
+        '''Run one method for a chain of amounts of data in its own workspace'''
+        method = job['method']
+        workspace = job['workspace']
+        settings = job['settings']
+        print_function = job['print_function']
+        structured = job['structured']
+        ret = {}
+        for amount in job['amounts']:
+            part_pos = job['train_pos'][amount]
+            part_neg = job['train_neg'][amount]
+            background = tboostsrl.modes(job['background'], [job['target']], useStdLogicVariables=False, workspace=workspace, **settings['modes'])
+            if print_function:
+                print_function('Amount of data: %s, Method: %s' % (amount, method))
+            if method == 'transfer':
+                # warm started chains revise the previous target model, no transfer is needed
+                transfer = job['transfer'] if structured is job['structured'] else None
+                [model, t_results, structured, pl_t_results] = revision.theory_revision(background, tboostsrl, job['target'], part_pos, part_neg, job['train_facts'], job['test_pos'], job['test_neg'], job['test_facts'], structured, transfer=transfer, trees=settings['trees'], max_revision_iterations=1, print_function=print_function, validation=settings.get('validation'), tolerance=settings.get('tolerance', 1e-3), seed=job['seed'])
+                t_results['parameter_' + str(amount)] = pl_t_results
+            else:
+                refine = revision.get_boosted_refine_file(structured, forceLearning=True) if structured else None
+                [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, job['target'], part_pos, part_neg, job['train_facts'], job['test_pos'], job['test_neg'], job['test_facts'], refine=refine, trees=settings['trees'], print_function=print_function, validation=settings.get('validation'), tolerance=settings.get('tolerance', 1e-3), seed=job['seed'])
+                if not job['warm_start']:
+                    structured = None
+            ret[method + '_' + str(amount)] = t_results
+        shutil.rmtree(workspace, ignore_errors=True)
+        # pool workers exit without running atexit handlers
+        if hasattr(print_function, 'flush'):
+            print_function.flush()
+        return ret
+
+    def learning_curve(background, target, train_pos, train_neg, train_facts, test_pos, test_neg, test_facts, transferred_structured, transfer=None, methods={}, amounts=[0.2, 0.4, 0.6, 0.8, 1.0], workspace='tboostsrl/curve', processes=1, warm_start=False, completed={}, checkpoint=None, seed=None, print_function=None):
+        '''Run every method for every amount of data.
+        methods maps a method name ('transfer', 'rdn_b' or 'rdn') to its
+        settings: {'trees': int, 'modes': dict of tboostsrl.modes parameters}
+        and optionally 'validation' and 'tolerance' to choose on held-out
+        examples, split with seed, how many trees are used for inference;
+        every tree is still learned (see learn_test_model).
+        Facts are written once and fractions run concurrently in isolated
+        workspaces when processes > 1. With warm_start, each fraction
+        starts from the model of the previous one.
+        Jobs whose results are all in completed are not run again and
+        checkpoint(key, t_results) is called as each job finishes.'''
+        shared_train_facts, shared_test_facts = curve.share_facts(workspace, train_facts, test_facts)
+        fractions_pos = dict(zip(amounts, curve.get_fractions(train_pos, amounts)))
+        fractions_neg = dict(zip(amounts, curve.get_fractions(train_neg, amounts)))
+        results = {}
+        jobs = []
+        for method, job_amounts in curve.get_jobs(list(methods), amounts, warm_start=warm_start):
+            keys = [method + '_' + str(amount) for amount in job_amounts]
+            if all(key in completed for key in keys):
+                for key in keys:
+                    results[key] = completed[key]
+                continue
+            jobs.append({
+                'method': method,
+                'amounts': job_amounts,
+                'workspace': os.path.join(workspace, method + '_' + str(job_amounts[0])),
+                'settings': methods[method],
+                'background': background,
+                'target': target,
+                'train_pos': dict((amount, fractions_pos[amount]) for amount in job_amounts),
+                'train_neg': dict((amount, fractions_neg[amount]) for amount in job_amounts),
+                'train_facts': shared_train_facts,
+                'test_pos': list(test_pos),
+                'test_neg': list(test_neg),
+                'test_facts': shared_test_facts,
+                'structured': transferred_structured if method == 'transfer' else None,
+                'transfer': transfer,
+                'warm_start': warm_start,
+                'seed': seed,
+                'print_function': print_function
+                })
+        pool = None
+        if processes > 1 and len(jobs) > 1:
+            pool = curve.get_pool(min(processes, len(jobs)))
+            outputs = pool.imap_unordered(curve.run_job, jobs, chunksize=1)
+        else:
+            outputs = (curve.run_job(job) for job in jobs)
+        try:
+            for output in outputs:
+                if checkpoint:
+                    for key, t_results in output.items():
+                        checkpoint(key, t_results)
+                results.update(output)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        shutil.rmtree(workspace, ignore_errors=True)
+        return results
@@ -0,0 +1,161 @@
+'''
+   SQLite backend to evaluate boosted trees over large fact bases
+   Name:         database.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import sqlite3
+
+from transfer import literal_re
+from evaluation import evaluation, is_variable
+
+class sqlite_store(object):
+    '''Facts kept in SQLite, one table per predicate and arity with an index
+    on each argument, so fact bases larger than memory can be used.
+    Trees are evaluated set-at-a-time: each node moves every example that
+    reaches it to its true or false child with one query, its clause being
+    translated into an EXISTS subquery joining the tables of its literals.
+    Examples satisfying a canonical conjunction are kept in a temporary table
+    shared by every tree of the forest.
+    It can be used wherever a fact_store is (see evaluation.get_leaves).'''
+
+    def __init__(self, path=':memory:', facts=[]):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # facts can be loaded again, durability is not needed
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('PRAGMA journal_mode = MEMORY')
+        self.tables = {}
+        for name, in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'p\\_%' ESCAPE '\\'"):
+            columns = self.connection.execute('PRAGMA table_info(' + name + ')').fetchall()
+            self.tables[name] = len(columns)
+        if len(facts):
+            self.load(facts)
+
+    def parse(self, fact):
+        match = literal_re.match(fact)
+        if match:
+            return (match.group(1), tuple(v.strip() for v in match.group(2).split(',')))
+        return None
+
+    def table_name(self, name, arity):
+        return 'p_' + name + '_' + str(arity)
+
+    def table(self, name, arity):
+        '''Return the table of a predicate, creating it if needed'''
+        table = self.table_name(name, arity)
+        if table not in self.tables:
+            columns = ', '.join('a' + str(i) + ' TEXT' for i in range(arity))
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ' + table + ' (' + columns + ')')
+            for i in range(arity):
+                self.connection.execute('CREATE INDEX IF NOT EXISTS ' + table + '_a' + str(i) + ' ON ' + table + ' (a' + str(i) + ')')
+            self.tables[table] = arity
+        return table
+
+    def load(self, facts):
+        '''Insert facts, grouped by table in a single transaction'''
+        groups = {}
+        for fact in facts:
+            literal = self.parse(fact)
+            if literal:
+                groups.setdefault((literal[0], len(literal[1])), []).append(literal[1])
+        with self.connection:
+            for (name, arity), rows in groups.items():
+                table = self.table(name, arity)
+                self.connection.executemany('INSERT INTO ' + table + ' VALUES (' + ', '.join(['?'] * arity) + ')', rows)
+
+    def add(self, fact):
+        self.load([fact])
+
+    def remove(self, fact):
+        literal = self.parse(fact)
+        if literal:
+            table = self.table_name(literal[0], len(literal[1]))
+            if table not in self.tables:
+                return
+            condition = ' AND '.join('a' + str(i) + ' = ?' for i in range(len(literal[1])))
+            with self.connection:
+                self.connection.execute('DELETE FROM ' + table + ' WHERE rowid = (SELECT rowid FROM ' + table + ' WHERE ' + condition + ' LIMIT 1)', literal[1])
+
+    def clear(self):
+        '''Delete every fact, keeping the tables and their indexes'''
+        with self.connection:
+            for table in self.tables:
+                self.connection.execute('DELETE FROM ' + table)
+
+    def __len__(self):
+        return sum(self.connection.execute('SELECT COUNT(*) FROM ' + table).fetchone()[0] for table in self.tables)
+
+    def clause_sql(self, literals, bound):
+        '''Translate a conjunction of literals into an EXISTS subquery.
+        bound maps variables to the columns of the example they are bound to.
+        Tables are not created here: a literal of a predicate without facts
+        can not be satisfied, so the subquery is false.'''
+        if not len(literals):
+            return ('1', [])
+        bound = dict(bound)
+        tables = []
+        conditions = []
+        params = []
+        for k in range(len(literals)):
+            name, args = literals[k]
+            alias = 't' + str(k)
+            table = self.table_name(name, len(args))
+            if table not in self.tables:
+                return ('0', [])
+            tables.append(table + ' ' + alias)
+            for i in range(len(args)):
+                column = alias + '.a' + str(i)
+                if is_variable(args[i]):
+                    if args[i] in bound:
+                        conditions.append(column + ' = ' + bound[args[i]])
+                    else:
+                        bound[args[i]] = column
+                else:
+                    conditions.append(column + ' = ?')
+                    params.append(args[i])
+        where = ' WHERE ' + ' AND '.join(conditions) if len(conditions) else ''
+        return ('EXISTS (SELECT 1 FROM ' + ', '.join(tables) + where + ')', params)
+
+    def get_leaves(self, structured, examples):
+        '''Return for each tree the leaf reached by each example'''
+        examples = [self.parse(example)[1] for example in examples]
+        arity = max([len(example) for example in examples] + [1])
+        c = self.connection
+        c.execute('DROP TABLE IF EXISTS temp.examples')
+        c.execute('CREATE TEMP TABLE examples (id INTEGER PRIMARY KEY, path TEXT, ' + ', '.join('a' + str(i) + ' TEXT' for i in range(arity)) + ')')
+        c.executemany('INSERT INTO temp.examples VALUES (?, NULL, ' + ', '.join(['?'] * arity) + ')', [(j,) + tuple(examples[j]) + (None,) * (arity - len(examples[j])) for j in range(len(examples))])
+        c.execute('CREATE INDEX temp.examples_path ON examples (path)')
+        bound = dict(('H' + str(i), 'examples.a' + str(i)) for i in range(arity))
+        ret = []
+        # the satisfying examples of a conjunction are found once for all trees
+        satisfying = {}
+        for struct in structured:
+            clauses = evaluation.node_clauses(struct)
+            c.execute("UPDATE temp.examples SET path = ''")
+            pending = ['']
+            while len(pending):
+                path = pending.pop(0)
+                if path not in clauses:
+                    continue
+                split = [] if path == '' else [path]
+                true, false = ','.join(split + ['true']), ','.join(split + ['false'])
+                clause = clauses[path]
+                if clause not in satisfying:
+                    satisfying[clause] = 'm' + str(len(satisfying))
+                    sql, params = self.clause_sql(clause, bound)
+                    c.execute('DROP TABLE IF EXISTS temp.' + satisfying[clause])
+                    c.execute('CREATE TEMP TABLE ' + satisfying[clause] + ' (id INTEGER PRIMARY KEY)')
+                    c.execute('INSERT INTO temp.' + satisfying[clause] + ' SELECT id FROM temp.examples WHERE ' + sql, params)
+                c.execute('UPDATE temp.examples SET path = ? WHERE path = ? AND id IN (SELECT id FROM temp.' + satisfying[clause] + ')', [true, path])
+                c.execute('UPDATE temp.examples SET path = ? WHERE path = ?', [false, path])
+                pending.append(true)
+                pending.append(false)
+            ret.append([row[0] for row in c.execute('SELECT path FROM temp.examples ORDER BY id')])
+        c.execute('DROP TABLE temp.examples')
+        for table in satisfying.values():
+            c.execute('DROP TABLE temp.' + table)
+        # release the read lock on the fact tables
+        c.commit()
+        return ret
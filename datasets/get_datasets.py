@@ -15,21 +15,79 @@ import random
 import pandas as pd
 import json
 import copy
+import bisect
+import collections.abc
+from array import array
+
+from tboostsrl.schema import get_schema
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
+class fold_view(collections.abc.Sequence):
+    '''Read-only sequence over the examples of some folds.
+    Examples are reached by index in the underlying fold lists, so
+    splitting, slicing and shuffling never copy them. The view is only
+    materialized when iterated, e.g. when written to disk.'''
+    def __init__(self, folds, selected, order=None):
+        self.folds = folds
+        self.selected = list(selected)
+        self.offsets = [0]
+        for i in self.selected:
+            self.offsets.append(self.offsets[-1] + len(folds[i]))
+        self.order = range(self.offsets[-1]) if order is None else order
+        # set once the syntax of the examples has been checked
+        self.validated = False
+
+    def locate(self, position):
+        '''Return the example at a position of the concatenated folds'''
+        j = bisect.bisect_right(self.offsets, position) - 1
+        return self.folds[self.selected[j]][position - self.offsets[j]]
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            view = fold_view(self.folds, self.selected, self.order[key])
+            view.validated = self.validated
+            return view
+        return self.locate(self.order[key])
+
+    def __iter__(self):
+        if isinstance(self.order, range) and self.order.step == 1:
+            # contiguous positions are read fold by fold
+            for j in range(len(self.selected)):
+                begin = max(self.order.start, self.offsets[j]) - self.offsets[j]
+                end = min(self.order.stop, self.offsets[j+1]) - self.offsets[j]
+                fold = self.folds[self.selected[j]]
+                for k in range(begin, end):
+                    yield fold[k]
+        else:
+            for position in self.order:
+                yield self.locate(position)
+
+    def shuffle(self, seed=None):
+        '''Shuffle the view in place by permuting its index only.
+        seed can be a random.Random, so several views share one stream.
+        Without a seed the module random state is used, as by random.shuffle.'''
+        order = array('L', self.order)
+        if isinstance(seed, random.Random):
+            rng = seed
+        else:
+            rng = random.Random(seed) if seed is not None else random
+        rng.shuffle(order)
+        self.order = order
+
+    def materialize(self):
+        '''Return the examples of the view as a new list'''
+        return list(self)
+
 class datasets:
     def get_kfold(test_number, folds):
         '''Separate examples into train and test set.
         It uses k-1 folds for training and 1 single fold for testing'''
-        train = []
-        test = []
-        for i in range(len(folds)):
-            if i == test_number:
-                test += folds[i]
-            else:
-                train += folds[i]
-        return (train, test)
+        train = [i for i in range(len(folds)) if i != test_number]
+        return (fold_view(folds, train), fold_view(folds, [test_number]))
 
     def get_kfold_separated(test_number, folds):
         train = []
@@ -44,21 +102,12 @@ class datasets:
     def get_kfold_small(train_number, folds):
         '''Separate examples into train and test set.
         It uses 1 single fold for training and k-1 folds for testing'''
-        train = []
-        test = []
-        for i in range(len(folds)):
-            if i == train_number:
-                train += folds[i]
-            else:
-                test += folds[i]
-        return (train, test)
+        test = [i for i in range(len(folds)) if i != train_number]
+        return (fold_view(folds, [train_number]), fold_view(folds, test))
 
     def group_folds(folds):
         '''Group folds in a single one'''
-        train = []
-        for i in range(len(folds)):
-            train += folds[i]
-        return train
+        return fold_view(folds, range(len(folds)))
 
     def split_into_folds(examples, n_folds=5, seed=None):
         '''For datasets as nell and yago that have only 1 mega-example'''
@@ -147,13 +196,7 @@ class datasets:
 
     def load(dataset, bk, target=None, seed=None, balanced=1):
         '''Load dataset from json and accept only predicates presented in bk'''
-        pattern = '^(\w+)\(.*\).$'
-        accepted = set()
-        for line in bk:
-            m = re.search(pattern, line)
-            if m:
-                relation = re.sub('[ _]', '', m.group(1))
-                accepted.add(relation)
+        accepted = get_schema(bk).accepted
         data = datasets.get_json_dataset(dataset)
         facts = []
         pos = []
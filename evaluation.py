@@ -0,0 +1,290 @@
+'''
+   In-process evaluation of boosted trees to score transferred models
+   Name:         evaluation.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import math
+
+from transfer import transfer, compiled_mapping, literal_re
+from tboostsrl.metrics import metrics
+
+def is_variable(argument):
+    '''Variables start with an uppercase letter, constants do not'''
+    return argument[:1].isupper()
+
+class fact_store(object):
+    '''Facts indexed by predicate and by the value of each argument.
+    A literal is matched against the smallest list of facts that agree
+    with one of its bound arguments.'''
+
+    def __init__(self, facts=[]):
+        self.facts = {}
+        self.index = {}
+        for fact in facts:
+            self.add(fact)
+
+    def add(self, fact):
+        match = literal_re.match(fact)
+        if match:
+            name = match.group(1)
+            args = tuple(v.strip() for v in match.group(2).split(','))
+            self.facts.setdefault(name, []).append(args)
+            for i in range(len(args)):
+                self.index.setdefault((name, i, args[i]), []).append(args)
+
+    def remove(self, fact):
+        match = literal_re.match(fact)
+        if match:
+            name = match.group(1)
+            args = tuple(v.strip() for v in match.group(2).split(','))
+            if args in self.facts.get(name, []):
+                self.facts[name].remove(args)
+                for i in range(len(args)):
+                    self.index[(name, i, args[i])].remove(args)
+
+    def __len__(self):
+        return sum(len(facts) for facts in self.facts.values())
+
+    def candidates(self, literal, binding):
+        '''Smallest list of facts that may match literal under binding'''
+        name, args = literal
+        best = self.facts.get(name, [])
+        for i in range(len(args)):
+            value = binding.get(args[i]) if is_variable(args[i]) else args[i]
+            if value is not None:
+                facts = self.index.get((name, i, value), [])
+                if len(facts) < len(best):
+                    best = facts
+        return best
+
+    def match(self, literal, binding):
+        '''Yield the bindings extended by every fact matching literal'''
+        args = literal[1]
+        for fact in self.candidates(literal, binding):
+            if len(fact) != len(args):
+                continue
+            new_binding = binding
+            for i in range(len(args)):
+                if is_variable(args[i]):
+                    value = new_binding.get(args[i])
+                    if value is None:
+                        if new_binding is binding:
+                            new_binding = dict(binding)
+                        new_binding[args[i]] = fact[i]
+                    elif value != fact[i]:
+                        break
+                elif args[i] != fact[i]:
+                    break
+            else:
+                yield new_binding
+
+    def satisfiable(self, literals, binding):
+        '''Whether the conjunction of literals has a solution extending binding'''
+        if not len(literals):
+            return True
+        # expand the literal with fewest candidate facts first
+        counts = [len(self.candidates(literal, binding)) for literal in literals]
+        i = counts.index(min(counts))
+        rest = literals[:i] + literals[i+1:]
+        for new_binding in self.match(literals[i], binding):
+            if self.satisfiable(rest, new_binding):
+                return True
+        return False
+
+class evaluation:
+    def get_store(facts):
+        '''Return facts as a store. Stores (fact_store, database.sqlite_store)
+        are used as they are, any other iterable of facts (a list, a
+        datasets.fold_view, a tboostsrl.facts_file) is indexed in a fact_store.'''
+        if hasattr(facts, 'satisfiable') or hasattr(facts, 'get_leaves'):
+            return facts
+        return fact_store(facts)
+
+    def get_example(example):
+        '''Get predicate and arguments of an example'''
+        match = literal_re.match(example)
+        return (match.group(1), tuple(v.strip() for v in match.group(2).split(',')))
+
+    def canonical(literals, head):
+        '''Canonical form of a conjunction of literals under the head of a tree.
+        Variables of the head are renamed after their position (H0, H1, ...),
+        literals are sorted by predicate, constants and head variables, and
+        the remaining variables are renamed in order of appearance (V0, V1, ...).
+        Conjunctions equal up to renaming and ordering get the same form.'''
+        names = dict((head[i], 'H' + str(i)) for i in range(len(head)) if is_variable(head[i]))
+        def shape(literal):
+            return (literal[0], tuple(names.get(arg, '_') if is_variable(arg) else arg for arg in literal[1]))
+        renamed = []
+        free = {}
+        for name, args in sorted(set(literals), key=lambda literal: (shape(literal), literal)):
+            new_args = []
+            for arg in args:
+                if is_variable(arg):
+                    if arg not in names and arg not in free:
+                        free[arg] = 'V' + str(len(free))
+                    arg = names.get(arg, free.get(arg))
+                new_args.append(arg)
+            renamed.append((name, tuple(new_args)))
+        return tuple(sorted(set(renamed)))
+
+    def node_clauses(struct):
+        '''Return the canonical conjunction tested at each node of a tree:
+        its literals and the literals of every ancestor taken as true.'''
+        head = transfer.tokenize(struct[0])[0][1]
+        nodes = struct[1]
+        clauses = {}
+        pending = [('', ())]
+        while len(pending):
+            path, conjunction = pending.pop(0)
+            if path not in nodes:
+                continue
+            literals = conjunction + transfer.tokenize(nodes[path])
+            clauses[path] = evaluation.canonical(literals, head)
+            split = [] if path == '' else [path]
+            pending.append((','.join(split + ['true']), literals))
+            pending.append((','.join(split + ['false']), conjunction))
+        return clauses
+
+    def get_leaf(struct, store, example, memo=None, clauses=None):
+        '''Return the path of the leaf an example reaches in a tree.
+        A node is true when its literals and the literals of every ancestor
+        taken as true are satisfiable together.
+        memo maps canonical conjunctions to whether the example satisfies them,
+        it can be shared by every tree evaluated on the same example.'''
+        if clauses is None:
+            clauses = evaluation.node_clauses(struct)
+        args = evaluation.get_example(example)[1]
+        binding = dict(('H' + str(i), args[i]) for i in range(len(args)))
+        path = ''
+        while path in clauses:
+            clause = clauses[path]
+            satisfied = memo.get(clause) if memo is not None else None
+            if satisfied is None:
+                satisfied = store.satisfiable(clause, binding)
+                if memo is not None:
+                    memo[clause] = satisfied
+            split = [] if path == '' else [path]
+            path = ','.join(split + ['true' if satisfied else 'false'])
+        return path
+
+    def get_leaves(structured, store, examples):
+        '''Return for each tree the leaf reached by each example.
+        Each distinct conjunction is tested once per example across all trees.
+        Stores that evaluate trees themselves (see database.sqlite_store) are used as they are.'''
+        if hasattr(store, 'get_leaves'):
+            return store.get_leaves(structured, examples)
+        clauses = [evaluation.node_clauses(struct) for struct in structured]
+        memos = [{} for example in examples]
+        return [[evaluation.get_leaf(structured[i], store, examples[j], memo=memos[j], clauses=clauses[i]) for j in range(len(examples))] for i in range(len(structured))]
+
+    def contributions(structured, values, store, examples):
+        '''Return the regression value each tree adds to each example
+        (examples x trees), values being the leaf values of each tree.
+        The probability of an example given the first k trees is the
+        sigmoid of the sum of its first k contributions.'''
+        ret = [[0.0] * len(structured) for example in examples]
+        for i, leaves in enumerate(evaluation.get_leaves(structured, store, examples)):
+            for j in range(len(examples)):
+                ret[j][i] = values[i].get(leaves[j], 0.0)
+        return ret
+
+    def sigmoid(x):
+        return 1 / (1 + math.exp(-x)) if x >= 0 else math.exp(x) / (1 + math.exp(x))
+
+    def fit(structured, store, pos, neg):
+        '''Learn leaf values of fixed trees by functional gradient boosting.
+        Each leaf gets the mean gradient of the examples reaching it, as
+        a regression tree fitted to the gradients would.
+        Returns the values of each tree and the probabilities of examples.'''
+        examples = list(pos) + list(neg)
+        labels = [1] * len(pos) + [0] * len(neg)
+        psi = [0.0] * len(examples)
+        values = []
+        for leaves in evaluation.get_leaves(structured, store, examples):
+            sums = {}
+            counts = {}
+            for j in range(len(examples)):
+                gradient = labels[j] - evaluation.sigmoid(psi[j])
+                sums[leaves[j]] = sums.get(leaves[j], 0.0) + gradient
+                counts[leaves[j]] = counts.get(leaves[j], 0) + 1
+            value = dict((leaf, sums[leaf] / counts[leaf]) for leaf in sums)
+            for j in range(len(examples)):
+                psi[j] += value[leaves[j]]
+            values.append(value)
+        return (values, [evaluation.sigmoid(x) for x in psi])
+
+    def coverage(structured, store, pos, neg):
+        '''Route examples through fixed trees as parameter learning would and
+        count what reaches each leaf and node, without running BoostSRL.
+        Gradients are computed with the leaf values fitted on previous trees.
+        Returns structured with leaves as [std dev, #neg, #pos] of the
+        gradients reaching them, as get_structured_tree does, and the
+        [true, false] variances of gradients at each node, as get_variances
+        does (nan when no example reaches a branch), to be used by
+        revision.get_bad_leaves and revision.get_boosted_candidate.'''
+        examples = list(pos) + list(neg)
+        labels = [1] * len(pos) + [0] * len(neg)
+        psi = [0.0] * len(examples)
+        covered = []
+        variances = []
+        for struct, leaves in zip(structured, evaluation.get_leaves(structured, store, examples)):
+            gradients = {}
+            counts = {}
+            for j in range(len(examples)):
+                gradients.setdefault(leaves[j], []).append(labels[j] - evaluation.sigmoid(psi[j]))
+                counts.setdefault(leaves[j], [0, 0])[labels[j]] += 1
+            nodes = struct[1]
+            paths = [] if '' not in nodes else [','.join(([] if path == '' else [path]) + [branch]) for path in nodes for branch in ['true', 'false']]
+            tree_leaves = {}
+            for path in paths:
+                if path not in nodes:
+                    values = gradients.get(path, [])
+                    tree_leaves[path] = [evaluation.variance(values)**0.5 if len(values) else 0.0] + counts.get(path, [0, 0])
+            tree_variances = {}
+            for path in nodes:
+                split = [] if path == '' else [path]
+                tree_variances[path] = []
+                for branch in ['true', 'false']:
+                    child = ','.join(split + [branch])
+                    values = [g for leaf in gradients if leaf == child or leaf.startswith(child + ',') for g in gradients[leaf]]
+                    tree_variances[path].append(evaluation.variance(values) if len(values) else float('nan'))
+            covered.append([struct[0], dict(nodes), tree_leaves])
+            variances.append(tree_variances)
+            value = dict((leaf, sum(gradients[leaf]) / len(gradients[leaf])) for leaf in gradients)
+            for j in range(len(examples)):
+                psi[j] += value[leaves[j]]
+        return (covered, variances)
+
+    def variance(values):
+        '''Variance of a list of values'''
+        mean = sum(values) / len(values)
+        return sum((v - mean)**2 for v in values) / len(values)
+
+    def score(structured, store, pos, neg):
+        '''Fit leaf values on examples and return their CLL'''
+        values, probabilities = evaluation.fit(structured, store, pos, neg)
+        return {'CLL': metrics.cll([1] * len(pos) + [0] * len(neg), probabilities), 'Leaf values': values}
+
+    def select_mappings(structured, mappings, pos, neg, facts, n_select=1, print_function=None):
+        '''Transfer structured under each mapping and score the transferred
+        models on target examples without running BoostSRL.
+        Returns the n_select best as (mapping, transferred structured, CLL),
+        to be revised by revision.theory_revision.'''
+        store = evaluation.get_store(facts)
+        scored = []
+        for mapping in mappings:
+            try:
+                transferred = transfer.transfer(structured, compiled_mapping(mapping))
+            except Exception as e:
+                # head is not mapped
+                if print_function:
+                    print_function('Mapping %s discarded: %s' % (mapping, e))
+                continue
+            cll = evaluation.score(transferred, store, pos, neg)['CLL']
+            if print_function:
+                print_function('Mapping %s, CLL: %s' % (mapping, cll))
+            scored.append((mapping, transferred, cll))
+        scored = sorted(scored, key=lambda x: x[2], reverse=True)
+        return scored[:n_select]
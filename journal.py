@@ -0,0 +1,93 @@
+'''
+   Append-only journal of experiment results
+   Name:         journal.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import os
+import json
+
+class journal(object):
+    '''Experiment results kept as JSON Lines, one record per finished job.
+    Each record is appended and fsync'd, so writing costs the same however
+    many results there are and a crash loses at most the running job.
+    Records are indexed by (nbr, fold, method) to resume experiments.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self.index = {}
+        # numbers of the lines that could not be read
+        self.corrupt = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.load()
+        self.f = open(self.path, 'a')
+
+    def load(self):
+        '''Read records from disk. A last line left incomplete by a crash is
+        removed from the file, other lines that can not be decoded are
+        skipped and their numbers kept in corrupt.'''
+        if not os.path.isfile(self.path):
+            return
+        valid = 0
+        with open(self.path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                if not line.endswith(b'\n'):
+                    # only the last line can miss its end
+                    break
+                valid += len(line)
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    self.corrupt.append(number)
+                    continue
+                self.add(record)
+        if valid < os.path.getsize(self.path):
+            with open(self.path, 'ab') as f:
+                f.truncate(valid)
+
+    def add(self, record):
+        self.records.append(record)
+        self.index[(record.get('nbr'), record.get('fold'), record.get('method'))] = record
+
+    def append(self, record):
+        '''Write a record to the end of the journal and wait for it to reach the disk'''
+        line = json.dumps(record)
+        self.f.write(line + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        # keep what was written, callers may change record afterwards
+        self.add(json.loads(line))
+
+    def checkpoint(self, nbr, fold, method, result):
+        '''Record the result of one job'''
+        self.append({'nbr': nbr, 'fold': fold, 'method': method, 'result': result})
+
+    def get(self, nbr, fold, method):
+        '''Return the result of a job or None if it has not finished'''
+        record = self.index.get((nbr, fold, method))
+        return record['result'] if record else None
+
+    def get_fold(self, nbr, fold):
+        '''Return the results of every finished job of a fold'''
+        return dict((record['method'], record['result']) for record in self.records if record.get('nbr') == nbr and record.get('fold') == fold)
+
+    def last(self):
+        '''Return the last record or None'''
+        return self.records[-1] if len(self.records) else None
+
+    def experiments(self):
+        '''Return the results of finished experiments as the list of folds
+        previously saved in <experiment_title>.json'''
+        return [record['result'] for record in self.records if record.get('method') == 'experiment']
+
+    def export(self, path):
+        '''Write finished experiments to a JSON file'''
+        with open(path, 'w') as fp:
+            json.dump(self.experiments(), fp)
+
+    def close(self):
+        self.f.close()
@@ -15,10 +15,13 @@ from datasets.get_datasets import *
 from revision import *
 from transfer import *
 from mapping import *
+from curve import *
 from tboostsrl import tboostsrl
 import numpy as np
 import random
 import json
+from journal import journal
+from logger import *
 
 #verbose=True
 source_balanced = False
@@ -32,39 +35,41 @@ numOfClauses = 8
 maxTreeDepth = 3
 trees = 10
 
+amounts = [0.2, 0.4, 0.6, 0.8, 1.0]
+# fractions of data run concurrently in isolated workspaces
+processes = 3
+# start each fraction from the model learned with the previous one
+warm_start = False
+
 if not os.path.exists('experiments'):
     os.makedirs('experiments')
 
-def print_function(message):
-    global experiment_title
-    global nbr
-    if not os.path.exists('experiments/' + experiment_title):
-        os.makedirs('experiments/' + experiment_title)
-    with open('experiments/' + experiment_title + '/' + str(nbr) + '_' + experiment_title + '.txt', 'a') as f:
-        print(message, file=f)
-        print(message)
+# structures are logged at DEBUG, use INFO to skip them
+print_function = logger(level=DEBUG)
+
+journals = {}
+
+def get_journal():
+    '''Journal of results of the current experiment'''
+    if experiment_title not in journals:
+        journals[experiment_title] = journal('experiments/' + experiment_title + '/' + experiment_title + '.jsonl')
+        if len(journals[experiment_title].corrupt):
+            print_function('Corrupt lines skipped in journal: %s' % journals[experiment_title].corrupt)
+    return journals[experiment_title]
 
 def save_experiment(data):
-    if not os.path.exists('experiments/' + experiment_title):
-        os.makedirs('experiments/' + experiment_title)
-    results = []
-    if os.path.isfile('experiments/' + experiment_title + '/' + experiment_title + '.json'):
-        with open('experiments/' + experiment_title + '/' + experiment_title + '.json', 'r') as fp:
-            results = json.load(fp)
-    results.append(data)
-    with open('experiments/' + experiment_title + '/' + experiment_title + '.json', 'w') as fp:
-        json.dump(results, fp)
+    get_journal().checkpoint(nbr, None, 'experiment', data)
 
 def get_number_experiment():
-    results = []
-    if os.path.isfile('experiments/' + experiment_title + '/' + experiment_title + '.json'):
-        with open('experiments/' + experiment_title + '/' + experiment_title + '.json', 'r') as fp:
-            results = json.load(fp)
-    return len(results)
+    return len(get_journal().experiments())
+
+def checkpoint(fold, method, data):
+    get_journal().checkpoint(nbr, fold, method, data)
+
+state = journal('experiments/learning_curve.jsonl')
 
 def save(data):
-    with open('experiments/learning_curve.json', 'w') as fp:
-        json.dump(data, fp)
+    state.append(data['save'])
 
 experiments = [
             #{'id': '51', 'source':'yeast', 'target':'webkb', 'predicate':'proteinclass', 'to_predicate':'departmentof'},
@@ -512,9 +517,8 @@ bk = {
             'locale(-person,+locale).']
       }
 
-if os.path.isfile('learning_curve.json'):
-    with open('learning_curve.json', 'r') as fp:
-        results = json.load(fp)
+if state.last():
+    results = { 'save': state.last() }
 else:
     results = { 'save': { }}
     firstRun = True
@@ -546,6 +550,7 @@ while results['save']['n_runs'] < n_runs:
     #logger = setup_logger('logger_' + experiment_title, 'log/' + experiment_title + '.log')
 
     nbr = get_number_experiment() + 1 #len(results['results'][experiment_title]) + 1
+    print_function.open('experiments/' + experiment_title + '/' + str(nbr) + '_' + experiment_title + '.txt')
     print_function('Starting experiment #' + str(nbr) + ' for ' + experiment_title+ '\n')
 
     source = experiments[experiment]['source']
@@ -553,24 +558,30 @@ while results['save']['n_runs'] < n_runs:
     predicate = experiments[experiment]['predicate']
     to_predicate = experiments[experiment]['to_predicate']
 
-    # Load source dataset
-    src_total_data = datasets.load(source, bk[source], seed=results['save']['seed'])
-    src_data = datasets.load(source, bk[source], target=predicate, balanced=source_balanced, seed=results['save']['seed'])
+    # source model of an interrupted experiment is kept in the journal
+    source_structured = get_journal().get(nbr, None, 'source')
+    if source_structured is None:
+        # Load source dataset
+        src_total_data = datasets.load(source, bk[source], seed=results['save']['seed'])
+        src_data = datasets.load(source, bk[source], target=predicate, balanced=source_balanced, seed=results['save']['seed'])
 
-    # Group and shuffle
-    src_facts = datasets.group_folds(src_data[0])
-    src_pos = datasets.group_folds(src_data[1])
-    src_neg = datasets.group_folds(src_data[2])
+        # Group and shuffle
+        src_facts = datasets.group_folds(src_data[0])
+        src_pos = datasets.group_folds(src_data[1])
+        src_neg = datasets.group_folds(src_data[2])
 
-    print_function('Start learning from source dataset\n')
+        print_function('Start learning from source dataset\n')
 
-    print_function('Source train facts examples: %s' % len(src_facts))
-    print_function('Source train pos examples: %s' % len(src_pos))
-    print_function('Source train neg examples: %s\n' % len(src_neg))
+        print_function('Source train facts examples: %s' % len(src_facts))
+        print_function('Source train pos examples: %s' % len(src_pos))
+        print_function('Source train neg examples: %s\n' % len(src_neg))
 
-    # learning from source dataset
-    background = tboostsrl.modes(bk[source], [predicate], useStdLogicVariables=False, maxTreeDepth=maxTreeDepth, nodeSize=nodeSize, numOfClauses=numOfClauses)
-    [model, total_revision_time, source_structured, will, variances] = revision.learn_model(background, tboostsrl, predicate, src_pos, src_neg, src_facts, refine=None, trees=trees, print_function=print_function)
+        # learning from source dataset
+        background = tboostsrl.modes(bk[source], [predicate], useStdLogicVariables=False, maxTreeDepth=maxTreeDepth, nodeSize=nodeSize, numOfClauses=numOfClauses)
+        [model, total_revision_time, source_structured, will, variances] = revision.learn_model(background, tboostsrl, predicate, src_pos, src_neg, src_facts, refine=None, trees=trees, print_function=print_function)
+        checkpoint(None, 'source', source_structured)
+    else:
+        print_function('Source model recovered from journal\n')
 
     #preds = mapping.get_preds(source_structured, bk[source])
     #print_function('Predicates from source: %s' % preds + '\n')
@@ -587,6 +598,12 @@ while results['save']['n_runs'] < n_runs:
     else:
         n_folds = len(tar_total_data[0])
 
+    # Load new predicate target dataset, the same for every fold
+    tar_data = datasets.load(target, bk[target], target=to_predicate, balanced=balanced, seed=results['save']['seed'])
+    if target in ['nell_sports', 'nell_finances', 'yago2s']:
+        # a single view for every fold so facts are validated only once
+        tar_facts = fold_view(tar_data[0], [0])
+
     results_save = []
     for i in range(n_folds):
         print_function('Starting fold ' + str(i+1) + '\n')
@@ -626,16 +643,13 @@ while results['save']['n_runs'] < n_runs:
 #            if to_predicate != new_target:
 #                raise Exception('Head predicate mapping is different from expected: %s and %s \n' % (new_target, to_predicate))
 
-        # Load new predicate target dataset
-        tar_data = datasets.load(target, bk[target], target=to_predicate, balanced=balanced, seed=results['save']['seed'])
-
         # Group and shuffle
         if target not in ['nell_sports', 'nell_finances', 'yago2s']:
             [tar_train_facts, tar_test_facts] =  datasets.get_kfold(i, tar_data[0])
             [tar_train_pos, tar_test_pos] =  datasets.get_kfold(i, tar_data[1])
             [tar_train_neg, tar_test_neg] =  datasets.get_kfold(i, tar_data[2])
         else:
-            [tar_train_facts, tar_test_facts] =  [tar_data[0][0], tar_data[0][0]]
+            [tar_train_facts, tar_test_facts] =  [tar_facts, tar_facts]
             to_folds_pos = datasets.split_into_folds(tar_data[1][0], n_folds=n_folds, seed=results['save']['seed'])
             to_folds_neg = datasets.split_into_folds(tar_data[2][0], n_folds=n_folds, seed=results['save']['seed'])
             [tar_train_pos, tar_test_pos] =  datasets.get_kfold(i, to_folds_pos)
@@ -653,39 +667,26 @@ while results['save']['n_runs'] < n_runs:
         tr_file = transfer.get_transfer_file(bk[source], bk[target], predicate, to_predicate, searchArgPermutation=True, allowSameTargetMap=False)
         new_target = to_predicate
 
-        random.shuffle(tar_train_pos)
-        random.shuffle(tar_train_neg)
-        for amount in [0.2, 0.4, 0.6, 0.8, 1.0]:
-            print_function('Amount of data: ' + str(amount))
-            part_tar_train_pos = tar_train_pos[:int(amount * len(tar_train_pos))]
-            part_tar_train_neg = tar_train_neg[:int(amount * len(tar_train_neg))]
-
-            # transfer and revision theory
-            background = tboostsrl.modes(bk[target], [to_predicate], useStdLogicVariables=False, maxTreeDepth=maxTreeDepth, nodeSize=nodeSize, numOfClauses=numOfClauses)
-            [model, t_results, structured, pl_t_results] = revision.theory_revision(background, tboostsrl, target, part_tar_train_pos, part_tar_train_neg, tar_train_facts, tar_test_pos, tar_test_neg, tar_test_facts, transferred_structured, transfer=tr_file, trees=trees, max_revision_iterations=1, print_function=print_function)
-            #t_results['Mapping results'] = mapping_results
-            t_results['parameter_' + str(amount)] = pl_t_results
-            ob_save['transfer_' + str(amount)] = t_results
-            print_function('Dataset: %s, Fold: %s, Type: %s, Time: %s' % (experiment_title, i+1, 'Transfer (trRDN-B)', time.strftime('%H:%M:%S', time.gmtime(time.time()-start))))
-            print_function(t_results)
-            print_function('\n')
-
-            print_function('Start learning from scratch in target domain\n')
-
-            # learning from scratch (RDN-B)
-            [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, new_target, part_tar_train_pos, part_tar_train_neg, tar_train_facts, tar_test_pos, tar_test_neg, tar_test_facts, trees=trees, print_function=print_function)
-            ob_save['rdn_b_' + str(amount)] = t_results
-            print_function('Dataset: %s, Fold: %s, Type: %s, Time: %s' % (experiment_title, i+1, 'Scratch (RDN-B)', time.strftime('%H:%M:%S', time.gmtime(time.time()-start))))
-            print_function(t_results)
-            print_function('\n')
-
-            # learning from scratch (RDN)
-            background = tboostsrl.modes(bk[target], [new_target], useStdLogicVariables=False, maxTreeDepth=3, nodeSize=2, numOfClauses=20)
-            [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, new_target, part_tar_train_pos, part_tar_train_neg, tar_train_facts, tar_test_pos, tar_test_neg, tar_test_facts, trees=1, print_function=print_function)
-            ob_save['rdn_' + str(amount)] = t_results
-            print_function('Dataset: %s, Fold: %s, Type: %s, Time: %s' % (experiment_title, i+1, 'Scratch (RDN)', time.strftime('%H:%M:%S', time.gmtime(time.time()-start))))
-            print_function(t_results)
-            print_function('\n')
+        # seeded by experiment and fold, so jobs resumed from the journal and
+        # jobs run again in this fold see the same order of examples
+        fold_random = random.Random('%s_%s' % (results['save']['seed'], i))
+        tar_train_pos.shuffle(fold_random)
+        tar_train_neg.shuffle(fold_random)
+        methods = {
+            'transfer': {'trees': trees, 'modes': {'maxTreeDepth': maxTreeDepth, 'nodeSize': nodeSize, 'numOfClauses': numOfClauses}},
+            'rdn_b': {'trees': trees, 'modes': {'maxTreeDepth': maxTreeDepth, 'nodeSize': nodeSize, 'numOfClauses': numOfClauses}},
+            'rdn': {'trees': 1, 'modes': {'maxTreeDepth': 3, 'nodeSize': 2, 'numOfClauses': 20}}
+            }
+        # transfer and revision theory, learning from scratch (RDN-B) and (RDN) for every amount of data
+        c_results = curve.learning_curve(bk[target], to_predicate, tar_train_pos, tar_train_neg, tar_train_facts, tar_test_pos, tar_test_neg, tar_test_facts, transferred_structured, transfer=tr_file, methods=methods, amounts=amounts, processes=processes, warm_start=warm_start, completed=get_journal().get_fold(nbr, i), checkpoint=lambda key, data: checkpoint(i, key, data), seed=results['save']['seed'], print_function=print_function)
+        for amount in amounts:
+            for key, name in [('transfer', 'Transfer (trRDN-B)'), ('rdn_b', 'Scratch (RDN-B)'), ('rdn', 'Scratch (RDN)')]:
+                t_results = c_results[key + '_' + str(amount)]
+                ob_save[key + '_' + str(amount)] = t_results
+                print_function('Amount of data: ' + str(amount))
+                print_function('Dataset: %s, Fold: %s, Type: %s, Time: %s' % (experiment_title, i+1, name, time.strftime('%H:%M:%S', time.gmtime(time.time()-start))))
+                print_function(t_results)
+                print_function('\n')
 
         results_save.append(ob_save)
     save_experiment(results_save)
@@ -0,0 +1,146 @@
+'''
+   Buffered logger to be used as print_function
+   Name:         logger.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import os
+import time
+import atexit
+import threading
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+
+# loggers unpickled in this process, copies of a logger share its file
+instances = {}
+
+class logger(object):
+    '''Log sink that can be passed as any print_function parameter.
+    Messages below level are dropped before being converted to strings, so
+    expensive objects (or callables returning the message) cost nothing when
+    their level is disabled. Enabled messages are buffered and written to
+    the log file with a single append per flush, which keeps lines of
+    concurrent workers from interleaving. A daemon thread flushes the buffer
+    every flush_interval seconds, so quiet workers do not hold lines back.'''
+
+    def __init__(self, path=None, level=INFO, echo=True, buffer_size=65536, flush_interval=1.0):
+        self.level = level
+        self.echo = echo
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self.fd = None
+        self.flusher = None
+        self.reset()
+        if path:
+            self.open(path)
+        atexit.register(self.close)
+
+    def reset(self):
+        '''Start an empty buffer owned by the current process'''
+        self.stop()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.size = 0
+        self.last_flush = time.time()
+        if self.fd is not None:
+            self.start()
+
+    def start(self):
+        '''Start the thread flushing the buffer, once per process'''
+        if self.flush_interval and self.flusher is None:
+            self.stopped = threading.Event()
+            self.flusher = threading.Thread(target=self.run, args=(self.stopped,), daemon=True)
+            self.flusher.start()
+
+    def stop(self):
+        '''Stop the thread flushing the buffer and wait for it to finish'''
+        if self.flusher is None:
+            return
+        self.stopped.set()
+        # a forked worker does not run the threads of its parent, join returns at once
+        if self.flusher is not threading.current_thread():
+            self.flusher.join()
+        self.flusher = None
+
+    def run(self, stopped):
+        '''Flush the buffer every flush_interval seconds until stopped'''
+        while not stopped.wait(self.flush_interval):
+            self.flush()
+
+    def __getstate__(self):
+        return { 'path': self.path, 'level': self.level, 'echo': self.echo, 'buffer_size': self.buffer_size, 'flush_interval': self.flush_interval }
+
+    def __setstate__(self, state):
+        # every job sent to a worker carries a copy, open the file once
+        key = (os.getpid(),) + tuple(sorted(state.items()))
+        if key in instances:
+            self.__dict__ = instances[key].__dict__
+        else:
+            self.__init__(**state)
+            instances[key] = self
+
+    def open(self, path):
+        '''Write next messages to path, creating its folder if needed'''
+        self.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.start()
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def __call__(self, message, level=INFO):
+        if level < self.level:
+            return
+        if callable(message):
+            message = message()
+        text = str(message)
+        if self.echo:
+            print(text)
+        if os.getpid() != self.pid:
+            # forked worker, the buffer inherited belongs to the parent
+            self.reset()
+        with self.lock:
+            self.buffer.append(text + '\n')
+            self.size += len(text) + 1
+            if self.size >= self.buffer_size or time.time() - self.last_flush >= self.flush_interval:
+                self.write()
+
+    def debug(self, message):
+        self(message, level=DEBUG)
+
+    def info(self, message):
+        self(message, level=INFO)
+
+    def warning(self, message):
+        self(message, level=WARNING)
+
+    def write(self):
+        '''Write the buffer to the log file, lock must be held'''
+        if self.fd is not None and self.size:
+            os.write(self.fd, ''.join(self.buffer).encode('utf-8'))
+        self.buffer = []
+        self.size = 0
+        self.last_flush = time.time()
+
+    def flush(self):
+        if os.getpid() != self.pid:
+            self.reset()
+        with self.lock:
+            self.write()
+
+    def close(self):
+        self.stop()
+        if self.fd is None:
+            return
+        self.flush()
+        os.close(self.fd)
+        self.fd = None
@@ -8,9 +8,12 @@
 
 import re
 import copy
+import math
 import random
 import time
 
+from tboostsrl.schema import get_schema
+
 class KnowledgeGraph(object):
     def __init__(self):
         self.dataset = []
@@ -23,19 +26,9 @@ class KnowledgeGraph(object):
     # {'parent': ['person', 'person'] }
     def background(self, lines):
         '''Load background of a dataset'''
-        st = {}
-        for line in lines:
-            m = re.search('^(\w+)\(([\w, +\-\#\`]+)*\).$', line)
-            if m:
-                relation = m.group(1)
-                relation = re.sub('[+\-\#\` ]', '', relation)
-                entities = m.group(2)
-                entities = re.sub('[+\-\#\` ]', '', entities)
-                entities = entities.split(',')
-                st[relation] = entities
-                for entity in entities:
-                    self.types.add(entity)
-        self.settings = st
+        background = get_schema(lines)
+        self.settings = dict((relation, list(types)) for relation, types in background.types.items())
+        self.types.update(background.all_types())
     
     # [('parent', ['lidia','rodrigo'])]
     def facts(self, lines):
@@ -245,27 +238,90 @@ class mapping:
 #                ret *= tarPatterns[p]
 #        return ret
             
-    def get_max_mappings(srcPreds, tarPreds):
+    def get_max_mappings(srcPreds, tarPreds, candidates=None):
         '''Returns max possible mappings considering only type pattern'''
         tarPatterns = mapping.get_max_patterns(tarPreds)
         ret = 1
         for pred in srcPreds:
             p = mapping.get_pattern(pred)
-            if p in tarPatterns:
+            if candidates is not None and mapping.get_types(pred)[0] in candidates:
+                ret *= (len(candidates[mapping.get_types(pred)[0]])+1) # it includes null mapping
+            elif p in tarPatterns:
                 ret *= (tarPatterns[p]+1) # it includes null mapping
         return ret
 
-    def mapping(srcPreds, tarPreds, forceHead=None, predsMapping={}, typeConstraints={}, i=None):
+    def path_signatures(sentences, preds):
+        '''Returns statistics of the paths each predicate appears in.
+        They do not depend on predicate names so source and target predicates can be compared'''
+        counts = {}
+        for pred in preds:
+            counts[mapping.get_types(pred)[0]] = [0, 0, 0, 0, 0, 0]
+        total = 0
+        for sentence in sentences:
+            total += len(sentence)
+            for j in range(len(sentence)):
+                name = sentence[j][1:] if sentence[j][0] == '_' else sentence[j]
+                if name not in counts:
+                    continue
+                c = counts[name]
+                c[0] += 1
+                if j + 1 < len(sentence) and sentence[j+1] == sentence[j]:
+                    c[1] += 1
+                if j + 1 < len(sentence) and sentence[j+1] == mapping.invert(sentence[j]):
+                    c[2] += 1
+                if j == 0:
+                    c[3] += 1
+                if sentence[j][0] != '_':
+                    c[4] += 1
+                c[5] += len(sentence)
+        signatures = {}
+        for name, c in counts.items():
+            n = max(c[0], 1)
+            # share of tokens relative to an uniform share among predicates
+            frequency = math.log1p(c[0] * len(counts) / max(total, 1))
+            signatures[name] = [frequency, c[1] / n, c[2] / n, c[3] / n, c[4] / n, c[5] / n / 4]
+        return signatures
+
+    def get_candidates(srcPreds, tarPreds, top_k, ranking=None, source_sentences=[], target_sentences=[]):
+        '''Returns the top_k target predicates each source predicate can be mapped to.
+        Target predicates are ranked by ranking (source predicate -> target predicates from best
+        to worst, as names or (name, score) pairs, e.g. from rembedding) or by the distance
+        of their path signatures'''
+        arities = dict(mapping.get_types(pred) for pred in tarPreds)
+        if ranking is None:
+            src_signatures = mapping.path_signatures(source_sentences, srcPreds)
+            tar_signatures = mapping.path_signatures(target_sentences, tarPreds)
+        candidates = {}
+        for srcPred in srcPreds:
+            src = mapping.get_types(srcPred)
+            if ranking is not None:
+                if src[0] not in ranking:
+                    continue
+                ranked = []
+                for tar in ranking[src[0]]:
+                    name = tar[0] if isinstance(tar, tuple) else tar
+                    name = name[1:] if name[0] == '_' else name
+                    if name in arities and name not in ranked:
+                        ranked.append(name)
+            else:
+                distance = lambda name: sum((a - b)**2 for a, b in zip(src_signatures[src[0]], tar_signatures[name]))
+                ranked = sorted(arities, key=distance)
+            ranked = [name for name in ranked if len(arities[name]) == len(src[1])]
+            candidates[src[0]] = set(ranked[:top_k])
+        return candidates
+
+    def mapping(srcPreds, tarPreds, forceHead=None, predsMapping={}, typeConstraints={}, i=None, candidates=None):
         '''Generate all possible mappings that are type consistent'''
         result = []
         if len(predsMapping):
-            result += mapping.mapping_recursive(srcPreds, tarPreds, predsMapping, typeConstraints, i, forceHead=forceHead)
+            result += mapping.mapping_recursive(srcPreds, tarPreds, predsMapping, typeConstraints, i, forceHead=forceHead, candidates=candidates)
         else:
-            result += mapping.mapping_recursive(srcPreds, tarPreds, {}, {}, 0, forceHead=forceHead)
+            result += mapping.mapping_recursive(srcPreds, tarPreds, {}, {}, 0, forceHead=forceHead, candidates=candidates)
         return result
     
-    def mapping_recursive(srcPreds, tarPreds, predsMapping, typeConstraints, i, forceHead=None):
-        '''Recursive function for generating possible mappings'''
+    def mapping_recursive(srcPreds, tarPreds, predsMapping, typeConstraints, i, forceHead=None, candidates=None):
+        '''Recursive function for generating possible mappings
+        A source predicate in candidates is only mapped to its candidate target predicates'''
         if i >= len(srcPreds):
             return [(predsMapping, typeConstraints)]
         else:
@@ -276,12 +332,14 @@ class mapping:
             if i > 0: # or not mapped_flag:
                 newPredsMapping = copy.deepcopy(predsMapping)
                 newTypeConstraints = copy.deepcopy(typeConstraints)
-                rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1)
+                rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1, candidates=candidates)
             #mapped_flag = False
             # make source head clause maps to a target head clause (or inverse)
             tPreds = tarPreds if i > 0 or not forceHead else [forceHead]
             for tarPred in tPreds:
                 tar = mapping.get_types(tarPred)
+                if candidates is not None and src[0] in candidates and tar[0] not in candidates[src[0]] and (i > 0 or not forceHead):
+                    continue
                 # avoid multiple mapping to target predicate (recursion)
                 targetPred = mapping.get_types(srcPreds[0])
                 if targetPred[0] not in predsMapping or tar[0] != predsMapping[targetPred[0]].replace('_', ''): 
@@ -291,7 +349,7 @@ class mapping:
                         newPredsMapping = copy.deepcopy(predsMapping)
                         newPredsMapping[src[0]] = tar[0]
                         newTypeConstraints = isCompatible[1]
-                        rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1)
+                        rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1, candidates=candidates)
                     if len(tar[1]) > 1:
                         isCompatible = mapping.is_compatible(src[1], tar[1][::-1], typeConstraints)
                         if isCompatible[0]:
@@ -299,11 +357,15 @@ class mapping:
                             newPredsMapping = copy.deepcopy(predsMapping)
                             newPredsMapping[src[0]] = '_' + tar[0]
                             newTypeConstraints = isCompatible[1]
-                            rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1)
+                            rets += mapping.mapping_recursive(srcPreds, tarPreds, newPredsMapping, newTypeConstraints, i+1, candidates=candidates)
             return rets
         
-    def get_best(sPreds, tPreds, srcFacts, tarFacts, n_sentences=50000, forceHead=None, threshold=10**7):
-        '''Return best mapping found given source and target predicates and facts'''
+    def get_best(sPreds, tPreds, srcFacts, tarFacts, n_sentences=50000, forceHead=None, threshold=10**7, top_k=None, ranking=None, n_best=None):
+        '''Return best mapping found given source and target predicates and facts
+        With top_k, each source predicate is only mapped to its top_k target candidates (see get_candidates)
+        before mappings are enumerated and scored
+        With n_best, a list of the n_best mappings is returned instead, best first, to be
+        evaluated by evaluation.select_mappings'''
         srcPreds = sPreds
         tarPreds = mapping.clean_preds(tPreds)
         start_time = time.time()
@@ -322,6 +384,10 @@ class mapping:
         target_sentences = set([' '.join(i) for i in target.sentences if len(i) > 1])
         results['Generating paths time'] = time.time() - new_start
         new_start = time.time()
+        candidates = None
+        if top_k is not None:
+            candidates = mapping.get_candidates(srcPreds, tarPreds, top_k, ranking=ranking, source_sentences=source.sentences, target_sentences=target.sentences)
+            results['Candidates'] = dict((key, sorted(value)) for key, value in candidates.items())
         best = -1
         best_mapping_size = 0
         best_mapping = None
@@ -332,19 +398,24 @@ class mapping:
         bestTypeConstraints = {}
         n_mappings = []
         mappings_end = []
-        results['Max mapping'] = mapping.get_max_mappings(srcPreds, tarPreds)
+        results['Max mapping'] = mapping.get_max_mappings(srcPreds, tarPreds, candidates=candidates)
+        # scores of the mappings of every search, by mapping
+        scores = {}
         while start < len(srcPreds):
-            max_mappings = mapping.get_max_mappings(srcPreds[start:end], tarPreds)
+            max_mappings = mapping.get_max_mappings(srcPreds[start:end], tarPreds, candidates=candidates)
             while max_mappings > threshold:
                 end -= 1
-                max_mappings = mapping.get_max_mappings(srcPreds[start:end], tarPreds)
+                max_mappings = mapping.get_max_mappings(srcPreds[start:end], tarPreds, candidates=candidates)
             mappings_end.append(end - start)
-            possible_mappings = mapping.mapping(srcPreds[0:end], tarPreds, forceHead=fHead, predsMapping=bestPredsMapping, typeConstraints=bestTypeConstraints, i=start)
+            possible_mappings = mapping.mapping(srcPreds[0:end], tarPreds, forceHead=fHead, predsMapping=bestPredsMapping, typeConstraints=bestTypeConstraints, i=start, candidates=candidates)
             for possible_item in possible_mappings:
                 mapping_dict = possible_item[0]
                 type_constraints = possible_item[1]
                 score = mapping.mapping_score(mapping_dict, source_sentences, target_sentences)
-                #scores.append((score, mapping_dict))
+                if n_best:
+                    key = tuple(sorted(mapping_dict.items()))
+                    if key not in scores or score > scores[key][1]:
+                        scores[key] = (len(mapping_dict), score, mapping_dict)
                 if score > best or len(mapping_dict) > best_mapping_size:
                     best = score
                     best_mapping_size = len(mapping_dict)
@@ -363,29 +434,37 @@ class mapping:
         new_start = time.time()
         results['Possible mappings'] = n_mappings
         results['Numbers preds mapping'] = mappings_end
-        #scores = []
-        #scores = sorted(scores, key=lambda tup: tup[0], reverse=True)
-        #print(scores)
         #print('Best Score: %s, Mapping: %s' % (best, best_mapping))
         results['Finding best mapping'] = time.time() - new_start
         results['Total time'] = time.time() - start_time
+        if n_best:
+            # mappings of every search, larger mappings first as in the search
+            best_key = tuple(sorted(best_mapping.items()))
+            ranked = sorted([item for key, item in scores.items() if key != best_key], key=lambda x: (x[0], x[1]), reverse=True)
+            bests = [best_mapping] + [item[2] for item in ranked][:n_best-1]
+            results['Best scores'] = [mapping.mapping_score(item, source_sentences, target_sentences) for item in bests]
+            return ([mapping.mapping_to_strings(item, srcPreds) for item in bests], results)
+        return (mapping.mapping_to_strings(best_mapping, srcPreds), results)
+
+    def mapping_to_strings(mapping_dict, srcPreds):
+        '''Returns mapping as strings used by transfer, e.g. workedunder(A,B) -> advisedby(B,A)'''
         mapd = []
         unaries = []
         for srcPred in srcPreds:
             s = mapping.get_types(srcPred)
             if len(s[1]) == 1:
                 unaries.append(s[0])
-        for key, value in best_mapping.items():
+        for key, value in mapping_dict.items():
             if key in unaries:
                 string = key + '(A) -> ' + value + '(A)'
             else:
                 string = key + '(A,B) -> ' + (value if value[0] != '_' else value[1:]) + ('(A,B)' if value[0] != '_' else '(B,A)')
             mapd.append(string)
-        return (mapd, results)
+        return mapd
         
     def get_preds(structured, p):
         '''Returns all predicates presented in boosted trees in order of nodes and trees'''
-        modes = mapping.clean_preds(p)
+        background = get_schema(p)
         pattern = '([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\\s]*)\)'
         m = re.findall(pattern, structured[0][0])
         if m:
@@ -400,32 +479,10 @@ class mapping:
                             if p[0] != target and p[0] not in preds_selected:
                                 preds.append(p[0])
                                 preds_selected.add(p[0])
-            preds_modes = {}
-            target_mode = None
-            for line in modes:
-                m = re.search('^(\w+)\(([\w, +\-\#\`]+)*\).$', line)
-                if m:
-                    relation = m.group(1)
-                    relation = re.sub('[+\-\#\` ]', '', relation)
-                    entities = m.group(2)
-                    entities = re.sub('[+\-\#\` ]', '', entities)
-                    if relation == target:
-                        target_mode = relation + '(' + entities + ').'
-                    if relation in preds_selected:
-                        preds_modes[relation] = '(' + entities + ').'
             for i in range(len(preds)):
-                preds[i] = preds[i] + preds_modes[preds[i]]
-            return [target_mode] + preds
+                preds[i] = background.declaration(preds[i])
+            return [background.declaration(target)] + preds
             
     def clean_preds(preds):
         '''Clean +/- from modes'''
-        ret = set()
-        for line in preds:
-            m = re.search('^(\w+)\(([\w, +\-\#\`]+)*\).$', line)
-            if m:
-                relation = m.group(1)
-                relation = re.sub('[+\-\#\` ]', '', relation)
-                entities = m.group(2)
-                entities = re.sub('[+\-\#\` ]', '', entities)
-                ret.add(relation + '(' + entities + ').')
-        return list(ret)
+        return list(get_schema(preds).declarations)
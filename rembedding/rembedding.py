@@ -4,10 +4,14 @@
 """
 
 from gensim.models import Word2Vec
-from gensim import matutils
 from sklearn.decomposition import PCA
 from matplotlib import pyplot
 import numpy as np
+import multiprocessing
+import hashlib
+import json
+import os
+import shutil
 import random
 
 class REmbedding(object):
@@ -18,6 +22,8 @@ class REmbedding(object):
         self.types = set()
         self.predicates = set()
         self.graph = self.Graph()
+        self.array_graph = None
+        self.graph_fingerprint = None
 
     # {'parent': ['person', 'person'] }
     def load_settings(self, st):
@@ -29,6 +35,8 @@ class REmbedding(object):
     # [('parent', ['alexis','rodrigo'])]
     def load_dataset(self, st):
         self.dataset = st
+        self.array_graph = None
+        self.graph_fingerprint = None
         for tupl in self.dataset:
             self.predicates.add(tupl[0])
             type1 = self.settings[tupl[0]][0]
@@ -37,74 +45,156 @@ class REmbedding(object):
             obj = type2 + '_' + tupl[1][1] if len(tupl[1]) > 1 else type2 + '_' + tupl[1][0]
             self.graph.add_relation(sub, tupl[0], obj, True if len(tupl[1]) > 1 else False)
             
-    def generate_sentences(self, max_depth=10, n_sentences=1000000):
+    def compile_graph(self):
+        """Compile the graph into arrays for walking, once per loaded dataset."""
+        if self.array_graph is None:
+            self.array_graph = ArrayGraph(self.graph)
+        return self.array_graph
+
+    def detached(self):
+        """Copy with only settings and the compiled graph, cheap to send to other processes."""
+        embedding = REmbedding()
+        embedding.settings = self.settings
+        embedding.types = self.types
+        embedding.predicates = self.predicates
+        embedding.array_graph = self.compile_graph()
+        embedding.graph_fingerprint = self.fingerprint()
+        return embedding
+
+    def fingerprint(self):
+        """Hash of settings and dataset, the same for the same facts in any order."""
+        if self.graph_fingerprint is None:
+            h = hashlib.sha1()
+            h.update(json.dumps(self.settings, sort_keys=True).encode('utf-8'))
+            for fact in sorted(json.dumps(tupl) for tupl in self.dataset):
+                h.update(fact.encode('utf-8'))
+            self.graph_fingerprint = h.hexdigest()
+        return self.graph_fingerprint
+
+    def generate_walks(self, max_depth=10, n_sentences=1000000, seed=None, processes=1, batch_size=100000):
+        """Random walks as a matrix of token ids, one walk per row padded with -1.
+
+        Walks are generated in batches by ArrayGraph.walk, split into one shard
+        per process when processes > 1. The same seed and number of processes
+        give the same walks.
+        """
+        graph = self.compile_graph()
+        seeds = np.random.SeedSequence(seed).spawn(processes)
+        sizes = [n_sentences // processes + (1 if i < n_sentences % processes else 0) for i in range(processes)]
+        shards = [(graph, sizes[i], max_depth, seeds[i], batch_size) for i in range(processes)]
+        if processes > 1:
+            pool = multiprocessing.Pool(processes=processes)
+            try:
+                walks = pool.map(walk_shard, shards)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            walks = [walk_shard(shard) for shard in shards]
+        return np.concatenate(walks)
+
+    def generate_sentences(self, max_depth=10, n_sentences=1000000, seed=None, processes=1):
         import time
         start_time = time.time()
-        self.sentences = []
-        for i in range(n_sentences):
-            node = self.graph.nodes[random.choice(list(self.graph.nodes))]
-            clauses = {}
-            sentence = [str(node)]
-            i_depth = 1
-            while(i_depth < max_depth):
-                if node not in clauses:
-                    clauses[node] = set()
-                edg = node.edges.difference(clauses[node])
-                if len(edg) == 0:
-                    break
-                edge = random.choice(list(edg))
-                if edge[1] not in clauses:
-                    clauses[edge[1]] = set()
-                clauses[node].add((edge[0], edge[1]))
-                clauses[edge[1]].add((edge[0][1:] if edge[0][:1] == '_' else '_' + edge[0], node))
-                sentence.append(str(edge[0]))
-                sentence.append(str(edge[1]))
-                node = edge[1]
-                i_depth += 1
-            self.sentences.append(sentence)
+        graph = self.compile_graph()
+        walks = self.generate_walks(max_depth=max_depth, n_sentences=n_sentences, seed=seed, processes=processes)
+        self.sentences = [graph.sentence(walk) for walk in walks]
         print("--- %s seconds ---" % (time.time() - start_time))
-        
-    def run_embedding(self, **kwargs):
-        self.model = Word2Vec(self.sentences, **kwargs)
-        
-    def centroid(self):
-        return np.mean(self.model[self.model.wv.vocab], axis=0)
-    
-    def type_centroid(self):
+
+    def corpus(self, max_depth=10, n_sentences=1000000, seed=None, path=None):
+        """Restartable corpus of walks to stream into run_embedding.
+
+        Walks are regenerated from the seed on every pass, or read from path
+        when it is given (see WalkCorpus.save), so the corpus is never held
+        in memory.
+        """
+        return WalkCorpus(self.compile_graph(), n_sentences=n_sentences, max_depth=max_depth, seed=seed, path=path)
+
+    def run_embedding(self, corpus=None, **kwargs):
+        self.model = Word2Vec(self.sentences if corpus is None else corpus, **kwargs)
+        self.index_vectors()
+
+    def index_vectors(self):
+        """Cache the vectors of the trained model for similarity queries."""
+        words = list(self.model.wv.vocab)
+        self.load_vectors(words, np.asarray(self.model.wv[words]))
+
+    def load_vectors(self, words, vectors):
+        """Use vectors, one row per word, for similarity queries.
+
+        Predicate vectors and type centroids are kept as matrices of unit
+        rows, so ranking them against any number of query vectors is a
+        single matrix product.
+        """
+        self.words = list(words)
+        self.word_index = dict((word, i) for i, word in enumerate(self.words))
+        self.vectors = vectors
         typ = {}
-        for word in list(self.model.wv.vocab):
+        predicates = []
+        for i, word in enumerate(self.words):
             s = word.split('_')
             if len(s) > 1 and len(s[0]) > 0:
                 if s[0] not in typ:
                     typ[s[0]] = []
-                typ[s[0]].append(self.model[word])
-        for t in typ:
-            typ[t] = np.mean(typ[t], axis=0)
-        return typ
+                typ[s[0]].append(i)
+            else:
+                predicates.append(i)
+        self.type_names = list(typ)
+        self.type_centroids = np.array([np.mean(self.vectors[typ[t]], axis=0) for t in self.type_names]).reshape(len(typ), self.vectors.shape[1])
+        self.type_matrix = unit_rows(self.type_centroids)
+        self.predicate_words = [self.words[i] for i in predicates]
+        self.predicate_matrix = unit_rows(self.vectors[predicates])
+
+    def save(self, path):
+        """Write vectors, vocabulary and graph fingerprint to the folder path."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        with open(os.path.join(path, 'embedding.json'), 'w') as f:
+            json.dump({'fingerprint': self.fingerprint(), 'words': self.words}, f)
+
+    def load(self, path, mmap=True):
+        """Read vectors saved by save, memory-mapped unless mmap is False.
+
+        Raises an exception if they were learned from another graph.
+        """
+        with open(os.path.join(path, 'embedding.json')) as f:
+            saved = json.load(f)
+        if saved['fingerprint'] != self.fingerprint():
+            raise(Exception('Embedding in ' + path + ' was not learned from this dataset and settings'))
+        self.load_vectors(saved['words'], np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r' if mmap else None))
+
+    def vector(self, word):
+        return self.vectors[self.word_index[word]]
+
+    def centroid(self):
+        return np.mean(self.vectors, axis=0)
+    
+    def type_centroid(self):
+        return dict(zip(self.type_names, self.type_centroids))
     
-    def most_similar_predicate(self, vector):
-        #self.model.wv.similarity()
-        top = self.model.wv.similar_by_vector(vector, topn=len(self.model.wv.vocab))
-        real = []
-        for t in top:
-            s = t[0].split('_')
-            if len(s) <= 1 or len(s[0]) == 0:
-                real.append(t)
-        return real
+    def most_similar_predicate(self, vector, topn=None):
+        return self.most_similar_predicates([vector], topn=topn)[0]
     
-    def most_similar_type(self, vector):
-        types = self.type_centroid()
-        distances = []
-        for t in types:
-            distances.append((t, np.dot(matutils.unitvec(vector), matutils.unitvec(types[t]))))
-        distances = sorted(distances, key=lambda x: x[1], reverse=True)
-        return distances
+    def most_similar_type(self, vector, topn=None):
+        return self.most_similar_types([vector], topn=topn)[0]
+
+    def most_similar_predicates(self, vectors, topn=None):
+        """Rank predicates by cosine similarity to each of vectors.
+
+        Returns one list of (predicate, similarity) per vector, sorted by
+        similarity and cut to topn when it is given.
+        """
+        return rank_rows(unit_rows(np.asarray(vectors)) @ self.predicate_matrix.T, self.predicate_words, topn)
+
+    def most_similar_types(self, vectors, topn=None):
+        """Rank type centroids by cosine similarity to each of vectors."""
+        return rank_rows(unit_rows(np.asarray(vectors)) @ self.type_matrix.T, self.type_names, topn)
         
     def plot_2d(self, color={}, plot_centroid=False):
-        X = self.model[self.model.wv.vocab]
+        X = self.vectors
         pca = PCA(n_components=2)
         result = pca.fit_transform(X)
-        words = list(self.model.wv.vocab)
+        words = self.words
         pyplot.figure(figsize=(10,10))
         if plot_centroid:
             c = pca.transform(np.array([self.centroid()]))
@@ -133,7 +223,7 @@ class REmbedding(object):
         
     def plot_2d_vectors(self, vectors):
         pca = PCA(n_components=2)
-        pca.fit(self.model[self.model.wv.vocab])
+        pca.fit(self.vectors)
         X = [value for key, value in vectors.items()]
         result = pca.transform(X)
         words = list(vectors)
@@ -175,4 +265,208 @@ class REmbedding(object):
                 return hash(self.name)
                 
             def __eq__(self, other):
-                return str(self) == str(other)
\ No newline at end of file
+                return str(self) == str(other)
+
+class ArrayGraph(object):
+    """Graph compiled into arrays for fast random walks.
+
+    Edges of node i are edges offsets[i]:offsets[i+1], going to targets[e]
+    through relation labels[e]. reverse[e] is the edge going back through
+    the inverse relation, or -1. Token ids are node ids for nodes and
+    n_nodes + label for relations.
+    """
+    def __init__(self, graph):
+        names = list(graph.nodes)
+        ids = dict((name, i) for i, name in enumerate(names))
+        relations = {}
+        offsets = [0]
+        targets = []
+        labels = []
+        for name in names:
+            for relation, node in graph.nodes[name].edges:
+                if relation not in relations:
+                    relations[relation] = len(relations)
+                targets.append(ids[str(node)])
+                labels.append(relations[relation])
+            offsets.append(len(targets))
+        self.n_nodes = len(names)
+        self.tokens = np.array(names + sorted(relations, key=relations.get), dtype=object)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.labels = np.array(labels, dtype=np.int64)
+        self.reverse = np.full(len(targets), -1, dtype=np.int64)
+        edge_ids = {}
+        for i in range(self.n_nodes):
+            for e in range(offsets[i], offsets[i+1]):
+                edge_ids[(i, labels[e], targets[e])] = e
+        for i in range(self.n_nodes):
+            for e in range(offsets[i], offsets[i+1]):
+                relation = self.tokens[self.n_nodes + labels[e]]
+                inverse = relation[1:] if relation[:1] == '_' else '_' + relation
+                if inverse in relations:
+                    self.reverse[e] = edge_ids.get((targets[e], relations[inverse], i), -1)
+
+    def walk(self, n_walks, max_depth, rng, tries=10):
+        """Walk n_walks random paths of up to max_depth nodes at once.
+
+        As in REmbedding, a walk never goes through an edge, in any direction,
+        twice. Each step samples every walk at once and resamples the walks
+        that hit a used edge; walks still rejected after tries are resolved
+        exactly.
+        """
+        walks = np.full((n_walks, 2 * max_depth - 1), -1, dtype=np.int64)
+        used = np.full((n_walks, 2 * (max_depth - 1)), -1, dtype=np.int64)
+        current = rng.integers(0, self.n_nodes, n_walks)
+        walks[:, 0] = current
+        active = np.arange(n_walks)
+        for step in range(max_depth - 1):
+            begin = self.offsets[current]
+            degree = self.offsets[current + 1] - begin
+            chosen = np.full(len(active), -1, dtype=np.int64)
+            pending = np.nonzero(degree > 0)[0]
+            for attempt in range(tries):
+                if not len(pending):
+                    break
+                edges = begin[pending] + (rng.random(len(pending)) * degree[pending]).astype(np.int64)
+                hit = (used[active[pending], :2 * step] == edges[:, None]).any(axis=1)
+                chosen[pending[~hit]] = edges[~hit]
+                pending = pending[hit]
+            for j in pending:
+                history = set(used[active[j], :2 * step])
+                free = [e for e in range(begin[j], begin[j] + degree[j]) if e not in history]
+                if len(free):
+                    chosen[j] = free[rng.integers(0, len(free))]
+            moving = chosen >= 0
+            active = active[moving]
+            chosen = chosen[moving]
+            if not len(active):
+                break
+            used[active, 2 * step] = chosen
+            used[active, 2 * step + 1] = self.reverse[chosen]
+            current = self.targets[chosen]
+            walks[active, 2 * step + 1] = self.n_nodes + self.labels[chosen]
+            walks[active, 2 * step + 2] = current
+        return walks
+
+    def sentence(self, walk):
+        """Tokens of a walk as strings"""
+        return list(self.tokens[walk[walk >= 0]])
+
+class WalkCorpus(object):
+    """Iterable of walk sentences that Word2Vec can scan several times.
+
+    Each pass walks the graph again in batches from the same seed, so every
+    pass yields the same sentences and memory is bounded by one batch. A
+    corpus saved with save is read back from a memory-mapped file of int32
+    token ids instead.
+    """
+    def __init__(self, graph, n_sentences=1000000, max_depth=10, seed=None, batch_size=10000, path=None):
+        self.graph = graph
+        self.n_sentences = n_sentences
+        self.max_depth = max_depth
+        # passes must repeat the same walks, so a missing seed is drawn once
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.batch_size = batch_size
+        self.path = path
+
+    def __len__(self):
+        return self.n_sentences
+
+    def batches(self):
+        """Walks as token id matrices of at most batch_size rows"""
+        if self.path:
+            walks = np.load(self.path, mmap_mode='r')
+            for i in range(0, len(walks), self.batch_size):
+                yield np.asarray(walks[i:i + self.batch_size])
+        else:
+            rng = np.random.default_rng(self.seed)
+            for i in range(0, self.n_sentences, self.batch_size):
+                yield self.graph.walk(min(self.batch_size, self.n_sentences - i), self.max_depth, rng)
+
+    def __iter__(self):
+        for walks in self.batches():
+            for walk in walks:
+                yield self.graph.sentence(walk)
+
+    def save(self, path):
+        """Write walks to path as int32 token ids and read them from there afterwards"""
+        walks = np.lib.format.open_memmap(path, mode='w+', dtype=np.int32, shape=(self.n_sentences, 2 * self.max_depth - 1))
+        i = 0
+        for batch in self.batches():
+            walks[i:i + len(batch)] = batch
+            i += len(batch)
+        walks.flush()
+        del walks
+        self.path = path
+
+class EmbeddingStore(object):
+    """Folder of trained embeddings to reuse them across experiments.
+
+    An embedding is stored under a key made of the fingerprint of its
+    dataset and settings, the walk parameters and the seed, so training
+    again with the same arguments becomes a lookup. Vectors are read back
+    memory-mapped.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, embedding, max_depth, n_sentences, seed):
+        parameters = json.dumps([embedding.fingerprint(), max_depth, n_sentences, seed])
+        return hashlib.sha1(parameters.encode('utf-8')).hexdigest()
+
+    def load(self, embedding, max_depth, n_sentences, seed):
+        """Load the stored vectors into embedding, return False if there are none."""
+        path = os.path.join(self.path, self.key(embedding, max_depth, n_sentences, seed))
+        if not os.path.isfile(os.path.join(path, 'embedding.json')):
+            return False
+        embedding.load(path)
+        return True
+
+    def save(self, embedding, max_depth, n_sentences, seed):
+        """Store the vectors of a trained embedding.
+
+        Vectors are written to a temporary folder renamed into place, so
+        concurrent runs never see a partial embedding.
+        """
+        path = os.path.join(self.path, self.key(embedding, max_depth, n_sentences, seed))
+        if os.path.isdir(path):
+            return
+        temporary = path + '.' + str(os.getpid())
+        embedding.save(temporary)
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            # stored meanwhile by another run
+            shutil.rmtree(temporary, ignore_errors=True)
+
+def unit_rows(matrix):
+    """Rows of matrix scaled to unit norm, zero rows are left as they are."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def rank_rows(similarities, names, topn=None):
+    """Sorted (name, similarity) lists for each row of a similarity matrix.
+
+    With topn only the topn best columns of each row are partitioned out
+    before sorting.
+    """
+    ranks = []
+    for row in similarities:
+        if topn is not None and topn < len(row):
+            best = np.argpartition(-row, topn)[:topn]
+            best = best[np.argsort(-row[best], kind='stable')]
+        else:
+            best = np.argsort(-row, kind='stable')
+        ranks.append([(names[i], float(row[i])) for i in best])
+    return ranks
+
+def walk_shard(shard):
+    """Generate a shard of walks in batches, used by REmbedding.generate_walks."""
+    graph, n_walks, max_depth, seed, batch_size = shard
+    rng = np.random.default_rng(seed)
+    batches = [graph.walk(min(batch_size, n_walks - i), max_depth, rng) for i in range(0, n_walks, batch_size)]
+    if not len(batches):
+        return np.full((0, 2 * max_depth - 1), -1, dtype=np.int64)
+    return np.concatenate(batches)
@@ -11,58 +11,72 @@ import os
 import re
 import copy
 import math
+import random
+
+from evaluation import evaluation, fact_store
+from tboostsrl.metrics import metrics
 
 class revision:
-    def delete_train_files():
+    def delete_train_files(workspace='tboostsrl'):
         '''Remove files from train folder'''
         try:
-            shutil.rmtree('tboostsrl/train')
+            shutil.rmtree(os.path.join(workspace, 'train'))
         except:
             pass
         try:
-            os.remove('tboostsrl/train_output.txt')
+            os.remove(os.path.join(workspace, 'train_output.txt'))
         except:
             pass
 
-    def delete_test_files():
+    def delete_test_files(workspace='tboostsrl'):
         '''Remove files from test folder'''
         try:
-            shutil.rmtree('tboostsrl/test')
+            shutil.rmtree(os.path.join(workspace, 'test'))
         except:
             pass
         try:
-            os.remove('tboostsrl/test_output.txt')
+            os.remove(os.path.join(workspace, 'test_output.txt'))
         except:
             pass
 
-    def delete_model_files():
+    def delete_model_files(workspace='tboostsrl'):
         '''Remove files of last model'''
-        revision.delete_train_files()
-        revision.delete_test_files()
+        revision.delete_train_files(workspace)
+        revision.delete_test_files(workspace)
 
-    def save_model_files():
+    def save_model_files(workspace='tboostsrl'):
         '''Remove files of last model as best model'''
+        best = os.path.join(workspace, 'best')
         try:
-            shutil.rmtree('tboostsrl/best')
+            shutil.rmtree(best)
         except:
             pass
-        os.mkdir('tboostsrl/best')
-        shutil.move('tboostsrl/train', 'tboostsrl/best')
-        shutil.move('tboostsrl/test', 'tboostsrl/best')
-        shutil.move('tboostsrl/train_output.txt', 'tboostsrl/best')
-        shutil.move('tboostsrl/test_output.txt', 'tboostsrl/best')
+        os.mkdir(best)
+        shutil.move(os.path.join(workspace, 'train'), best)
+        shutil.move(os.path.join(workspace, 'test'), best)
+        shutil.move(os.path.join(workspace, 'train_output.txt'), best)
+        shutil.move(os.path.join(workspace, 'test_output.txt'), best)
 
-    def get_saved_model_files():
+    def get_saved_model_files(workspace='tboostsrl'):
         '''Recover model files of best model'''
-        shutil.move('tboostsrl/best/train', 'tboostsrl')
-        shutil.move('tboostsrl/best/test', 'tboostsrl')
-        shutil.move('tboostsrl/best/train_output.txt', 'tboostsrl')
-        shutil.move('tboostsrl/best/test_output.txt', 'tboostsrl')
+        best = os.path.join(workspace, 'best')
+        shutil.move(os.path.join(best, 'train'), workspace)
+        shutil.move(os.path.join(best, 'test'), workspace)
+        shutil.move(os.path.join(best, 'train_output.txt'), workspace)
+        shutil.move(os.path.join(best, 'test_output.txt'), workspace)
         try:
-            shutil.rmtree('tboostsrl/best')
+            shutil.rmtree(best)
         except:
             pass
 
+    def print_debug(print_function, message):
+        '''Print large structures only when print_function has debug level enabled.
+        message can be a callable building the text, only called if printed.'''
+        if hasattr(print_function, 'debug'):
+            print_function.debug(message)
+        else:
+            print_function(message() if callable(message) else message)
+
     def get_tree_helper(path, nodes, leaves, variances, no_variances=False):
         children = [None, None]
         split = [] if path == '' else path.split(',')
@@ -202,6 +216,22 @@ class revision:
             refine += revision.get_candidate(structs[i], variances[i], i+1, no_pruning=no_pruning)
         return refine
 
+    def get_boosted_bad_leaves(structs):
+        '''Get revision points of every tree as (treenumber, path, value), worst first'''
+        ret = []
+        for i in range(len(structs)):
+            ret += [(i+1, path, value) for path, value in revision.get_bad_leaves(structs[i])]
+        ret.sort(key=lambda x: x[2])
+        return ret
+
+    def get_coverage_candidate(structured, facts, pos, neg, no_pruning=False):
+        '''Get candidate with leaf counts and variances computed in process
+        from target examples instead of a parameter learning run of BoostSRL.
+        Returns the candidate and the revision points found.'''
+        store = evaluation.get_store(facts)
+        covered, variances = evaluation.coverage(structured, store, pos, neg)
+        return (revision.get_boosted_candidate(covered, variances, no_pruning=no_pruning), revision.get_boosted_bad_leaves(covered))
+
     def get_branch_with(branch, next_branch):
         '''Append next_branch at branch'''
         if not branch:
@@ -241,15 +271,61 @@ class revision:
             refine += revision.get_refine_file(structs[i], treenumber=i+1, forceLearning=forceLearning)
         return refine
 
-    def learn_model(background, tboostsrl, target, train_pos, train_neg, facts, refine=None, trees=10, print_function=None):
-        '''Train and test a boosted or single tree'''
-        revision.delete_model_files()
+    def split_validation(pos, neg, validation, seed=None):
+        '''Hold out a fraction of positive and negative examples for validation.
+        Without a seed the module random state is used, as by the datasets.'''
+        rng = random.Random(seed) if seed is not None else random
+        pos = list(pos)
+        neg = list(neg)
+        rng.shuffle(pos)
+        rng.shuffle(neg)
+        n_pos = int(round(validation * len(pos)))
+        n_neg = int(round(validation * len(neg)))
+        return (pos[n_pos:], neg[n_neg:], pos[:n_pos], neg[:n_neg])
+
+    def get_validation(pos, neg, validation, seed=None):
+        '''Examples to learn from and held-out (pos, neg) examples, None without validation.
+        validation is the fraction of examples to hold out, or examples already
+        held out as a (pos, neg) pair, which are then not taken from pos and neg.'''
+        if not validation:
+            return (pos, neg, None)
+        if isinstance(validation, tuple):
+            return (pos, neg, validation)
+        pos, neg, validation_pos, validation_neg = revision.split_validation(pos, neg, validation, seed=seed)
+        return (pos, neg, (validation_pos, validation_neg))
+
+    def get_early_stopping(model, trees, facts, validation_pos, validation_neg, tolerance=1e-3):
+        '''Number of trees after which adding a tree improves validation CLL
+        by less than tolerance, and the validation CLL of every number of trees.
+        The selection is post hoc: every tree of model was already learned.'''
+        structured = [model.get_structured_tree(treenumber=i+1) for i in range(trees)]
+        values = [model.get_leaf_values(treenumber=i+1) for i in range(trees)]
+        examples = list(validation_pos) + list(validation_neg)
+        labels = [1] * len(validation_pos) + [0] * len(validation_neg)
+        contributions = evaluation.contributions(structured, values, fact_store(facts), examples)
+        clls = [results['CLL'] for results in metrics.prefixes(labels, contributions)]
+        n_trees = 1
+        while n_trees < trees and clls[n_trees] - clls[n_trees-1] >= tolerance:
+            n_trees += 1
+        return (n_trees, clls)
+
+    def learn_model(background, tboostsrl, target, train_pos, train_neg, facts, refine=None, trees=10, print_function=None, validation=None, tolerance=1e-3, seed=None):
+        '''Train and test a boosted or single tree.
+        validation (a fraction or held-out examples, see get_validation) only
+        chooses how many trees are used for inference: BoostSRL learns every
+        tree from the examples not held out, then the trees before validation
+        CLL stops improving by tolerance are kept. Learning time is not reduced.'''
+        revision.delete_model_files(background.workspace)
+        train_pos, train_neg, held_out = revision.get_validation(train_pos, train_neg, validation, seed=seed)
         model = tboostsrl.train(background, train_pos, train_neg, facts, refine=refine, trees=trees)
+        if held_out:
+            trees, validation_cll = revision.get_early_stopping(model, trees, facts, held_out[0], held_out[1], tolerance=tolerance)
+            if print_function:
+                print_function('Validation CLL: %s, trees used for inference: %s' % (validation_cll, trees))
         will = ['WILL Produced-Tree #'+str(i+1)+'\n'+('\n'.join(model.get_will_produced_tree(treenumber=i+1))) for i in range(trees)]
         variances = [model.get_variances(treenumber=i+1) for i in range(trees)]
         if print_function:
-            for i in will:
-                print_function(i)
+            revision.print_debug(print_function, lambda: '\n'.join(will))
             print_function('\n')
         learning_time = model.traintime()
         structured = []
@@ -257,25 +333,42 @@ class revision:
             structured.append(model.get_structured_tree(treenumber=i+1).copy())
         return [model, learning_time, structured, will, variances]
 
-    def learn_test_model(background, tboostsrl, target, train_pos, train_neg, train_facts, test_pos, test_neg, test_facts, refine=None, transfer=None, trees=10, print_function=None):
-        '''Train and test a boosted or single tree'''
-        revision.delete_model_files()
+    def learn_test_model(background, tboostsrl, target, train_pos, train_neg, train_facts, test_pos, test_neg, test_facts, refine=None, transfer=None, trees=10, print_function=None, cache=None, validation=None, tolerance=1e-3, seed=None):
+        '''Train and test a boosted or single tree.
+        validation (a fraction or held-out examples, see get_validation) only
+        chooses how many trees are used for inference: BoostSRL learns every
+        tree from the examples not held out, then the trees before validation
+        CLL stops improving by tolerance are tested. Learning time is not
+        reduced. The number of trees tested is recorded in the results.'''
+        revision.delete_model_files(background.workspace)
+        train_pos, train_neg, held_out = revision.get_validation(train_pos, train_neg, validation, seed=seed)
         model = tboostsrl.train(background, train_pos, train_neg, train_facts, refine=refine, transfer=transfer, trees=trees)
+        if held_out:
+            trees, validation_cll = revision.get_early_stopping(model, trees, train_facts, held_out[0], held_out[1], tolerance=tolerance)
+            if print_function:
+                print_function('Validation CLL: %s, trees used for inference: %s' % (validation_cll, trees))
         will = ['WILL Produced-Tree #'+str(i+1)+'\n'+('\n'.join(model.get_will_produced_tree(treenumber=i+1))) for i in range(trees)]
         variances = [model.get_variances(treenumber=i+1) for i in range(trees)]
         if print_function:
-            for i in will:
-                print_function(i)
+            revision.print_debug(print_function, lambda: '\n'.join(will))
             print_function('\n')
         learning_time = model.traintime()
         structured = []
         for i in range(trees):
             structured.append(model.get_structured_tree(treenumber=i+1).copy())
-        results = tboostsrl.test(model, test_pos, test_neg, test_facts, trees=trees)
+        results = tboostsrl.test(model, test_pos, test_neg, test_facts, trees=trees, cache=cache)
         inference_time = results.testtime()
         t_results = results.summarize_results()
         t_results['Learning time'] = learning_time
         t_results['Inference time'] = inference_time
+        if held_out:
+            t_results['Trees'] = trees
+            t_results['Validation CLL'] = validation_cll
+        for key in ['CPU time', 'Peak RSS']:
+            if key in getattr(model, 'usage', {}):
+                t_results['Learning ' + key] = model.usage[key]
+            if key in results.usage:
+                t_results['Inference ' + key] = results.usage[key]
         if print_function:
             print_function('Results')
             print_function('   AUC ROC   = %s' % t_results['AUC ROC'])
@@ -291,8 +384,8 @@ class revision:
             print_function('\n')
         return [model, t_results, structured, will, variances]
 
-    def score_model(model, tboostsrl, test_pos, test_neg, test_facts, trees=10, print_function=None):
-        results = tboostsrl.test(model, test_pos, test_neg, test_facts, trees=trees)
+    def score_model(model, tboostsrl, test_pos, test_neg, test_facts, trees=10, print_function=None, cache=None):
+        results = tboostsrl.test(model, test_pos, test_neg, test_facts, trees=trees, cache=cache)
         inference_time = results.testtime()
         t_results = results.summarize_results()
         t_results['Inference time'] = inference_time
@@ -308,9 +401,16 @@ class revision:
             print_function('Total scoring time: %s seconds' % inference_time)
         return t_results
 
-    def theory_revision(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, structured_tree, trees=10, max_revision_iterations=1, transfer=None, print_function=None):
-        '''Function responsible for starting the theory revision process'''
+    def theory_revision(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, structured_tree, trees=10, max_revision_iterations=1, transfer=None, print_function=None, cache=None, validation=None, tolerance=1e-3, seed=None):
+        '''Function responsible for starting the theory revision process.
+        With validation, examples are held out once: parameter learning and
+        every revision learn from the same remaining examples, and the held-out
+        ones choose after parameter learning how many trees are used for
+        inference and revised (see learn_test_model). Learning time is not
+        reduced.'''
         total_revision_time = 0
+        # one split, so revisions do not learn from the examples held out
+        r_train_pos, r_train_neg, validation = revision.get_validation(r_train_pos, r_train_neg, validation, seed=seed)
         best_cll = - float('inf')
         best_structured = None
         best_model_results = None
@@ -322,17 +422,17 @@ class revision:
             print_function('Performing Parameter Learning')
             print_function('******************************************')
             print_function('Refine')
-            for item in revision.get_boosted_refine_file(structured_tree):
-                print_function(item)
+            revision.print_debug(print_function, lambda: '\n'.join(revision.get_boosted_refine_file(structured_tree)))
             print_function('\n')
-        [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, refine=revision.get_boosted_refine_file(structured_tree), transfer=transfer, trees=trees, print_function=print_function)
+        [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, refine=revision.get_boosted_refine_file(structured_tree), transfer=transfer, trees=trees, print_function=print_function, cache=cache, validation=validation, tolerance=tolerance, seed=seed)
+        trees = t_results.get('Trees', trees)
         # saving performed parameter learning will
         #tboostsrl.write_to_file(will, 'tboostsrl/last_will.txt')
         #tboostsrl.write_to_file([str(structured)], 'tboostsrl/last_structured.txt')
         pl_t_results = copy.deepcopy(t_results)
 
         # scoring model
-        scored_results = revision.score_model(model, tboostsrl, r_train_pos, r_train_neg, train_facts, trees=trees, print_function=print_function)
+        scored_results = revision.score_model(model, tboostsrl, r_train_pos, r_train_neg, train_facts, trees=trees, print_function=print_function, cache=cache)
         best_cll = scored_results['CLL']
         best_model_results = copy.deepcopy(t_results)
         total_revision_time = pl_t_results['Learning time'] + scored_results['Inference time']
@@ -343,10 +443,10 @@ class revision:
         best_structured = copy.deepcopy(structured)
         if print_function:
             print_function('Structure after Parameter Learning')
-            print_function(best_structured)
-            print_function(variances)
+            revision.print_debug(print_function, best_structured)
+            revision.print_debug(print_function, variances)
             print_function('\n')
-        revision.save_model_files()
+        revision.save_model_files(background.workspace)
 
         if print_function:
             print_function('******************************************')
@@ -366,8 +466,7 @@ class revision:
                 candidate = revision.get_boosted_candidate(best_structured, variances, no_pruning=True)
             if print_function:
                 print_function('Candidate for revision')
-                for item in candidate:
-                    print_function(item)
+                revision.print_debug(print_function, lambda: '\n'.join(candidate))
                 print_function('\n')
             #tboostsrl.write_to_file(candidate, 'tboostsrl/last_candidate.txt')
             if print_function:
@@ -377,17 +476,17 @@ class revision:
                 #for i in range(trees):
                 #    print('Tree #%s: %s' % (i+1, str(get_bad_leaves(best_structured[i]))))
                 #print('\n')
-            [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, trees=trees, refine=candidate, print_function=print_function)
+            [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, target, r_train_pos, r_train_neg, train_facts, test_pos, test_neg, test_facts, trees=trees, refine=candidate, print_function=print_function, cache=cache)
             #t_results['Learning time'] = t_results['Learning time'] + pl_t_results['Learning time']
             # scoring model
-            scored_results = revision.score_model(model, tboostsrl, r_train_pos, r_train_neg, train_facts, trees=trees, print_function=print_function)
+            scored_results = revision.score_model(model, tboostsrl, r_train_pos, r_train_neg, train_facts, trees=trees, print_function=print_function, cache=cache)
             total_revision_time = total_revision_time + t_results['Learning time'] + scored_results['Inference time']
             if scored_results['CLL'] > best_cll:
                 found_better = True
                 best_cll = scored_results['CLL']
                 best_structured = copy.deepcopy(structured)
                 best_model_results = copy.deepcopy(t_results)
-                revision.save_model_files()
+                revision.save_model_files(background.workspace)
             if print_function:
                 print_function('Refined model CLL: %s' % scored_results['CLL'])
                 print_function('\n')
@@ -396,6 +495,8 @@ class revision:
 
         # set total revision time to t_results learning time
         best_model_results['Learning time'] = total_revision_time
+        if validation:
+            best_model_results['Trees'] = trees
         # test best model
         if print_function:
             print_function('******************************************')
@@ -412,9 +513,9 @@ class revision:
             print_function('Total learning time: %s seconds' % best_model_results['Learning time'])
             print_function('Total inference time: %s seconds' % best_model_results['Inference time'])
             print_function('AUC ROC: %s' % best_model_results['AUC ROC'])
-        revision.delete_model_files()
+        revision.delete_model_files(background.workspace)
         #get_saved_model_files()
-        revision.delete_test_files()
+        revision.delete_test_files(background.workspace)
         if print_function:
             print_function('Total revision time: %s' % total_revision_time)
             print_function('Best scored revision CLL: %s' % best_cll)
@@ -0,0 +1,281 @@
+'''
+   Local scoring server of models learned by BoostSRL
+   Name:         server.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import os
+import re
+import json
+import time
+import queue
+import bisect
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from transfer import literal_re
+from evaluation import evaluation, fact_store
+from database import sqlite_store
+from tboostsrl import tboostsrl
+from tboostsrl.metrics import metrics
+
+class boosted_model(object):
+    '''Trees and leaf values of a model read from its WILL regression trees.
+    path is the workspace the model was learned in or the WILL file itself.'''
+
+    def __init__(self, path, target):
+        if os.path.isdir(path):
+            path = os.path.join(path, 'train/models/WILLtheories/' + target + '_learnedWILLregressionTrees.txt')
+        with open(path, 'r') as f:
+            text = f.read()
+        self.target = target
+        n_trees = len(re.findall(r'%%%%%  WILL-Produced Tree #\d+ ', text))
+        self.trees = [tboostsrl.parse_will_tree(tboostsrl.will_produced_tree(text, '#' + str(i+1))) for i in range(n_trees)]
+
+    def contributions(self, store, examples):
+        '''Return the value each tree adds to each example (examples x trees)'''
+        return evaluation.contributions(self.trees, [tree[3] for tree in self.trees], store, examples)
+
+    def score(self, store, examples):
+        '''Return the probability of each example given the facts in store'''
+        return [evaluation.sigmoid(sum(values)) for values in self.contributions(store, examples)]
+
+    def prefix_results(self, store, pos, neg, threshold=0.5):
+        '''Return the metrics of the model truncated to 1..N trees, from one pass'''
+        return metrics.prefixes([1] * len(pos) + [0] * len(neg), self.contributions(store, list(pos) + list(neg)), threshold=threshold)
+
+class latency_histogram(object):
+    '''Counts of request latencies in buckets bounded by milliseconds'''
+
+    bounds = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds, seconds * 1000)] += 1
+            self.total += seconds
+
+    def to_dict(self):
+        with self.lock:
+            n = sum(self.counts)
+            labels = ['<=' + str(bound) + 'ms' for bound in self.bounds] + ['>' + str(self.bounds[-1]) + 'ms']
+            return {'count': n, 'mean ms': 1000 * self.total / n if n else 0.0, 'buckets': dict(zip(labels, self.counts))}
+
+class scoring_server(object):
+    '''Scores examples against models kept in memory with an indexed fact base.
+    Requests are queued and scored together by a single thread in micro-batches
+    of up to max_batch examples, waiting at most max_wait seconds to fill one.
+    At most max_concurrency requests are accepted at a time, others are refused.'''
+
+    def __init__(self, models, facts=[], max_batch=256, max_wait=0.005, max_concurrency=64, store=None):
+        self.models = models
+        self.store = store if store is not None else fact_store(facts)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.histogram = latency_histogram()
+        self.batcher = threading.Thread(target=self.run_batches, daemon=True)
+        self.batcher.start()
+
+    def check_examples(examples):
+        '''Raise an exception unless examples is a list of atoms'''
+        if not isinstance(examples, list):
+            raise(Exception('Examples should be a list of atoms.'))
+        for example in examples:
+            if not isinstance(example, str) or not literal_re.match(example):
+                raise(Exception('Invalid atom: ' + json.dumps(example)))
+
+    def check_facts(facts):
+        '''Raise an exception unless facts is a list of strings'''
+        if not isinstance(facts, list) or not all(isinstance(fact, str) for fact in facts):
+            raise(Exception('Facts should be a list of atoms.'))
+
+    def score(self, model, examples):
+        '''Score examples with a model, waiting for the batch they are put in'''
+        if not isinstance(model, str) or model not in self.models:
+            raise(Exception('Model ' + str(model) + ' is not loaded.'))
+        scoring_server.check_examples(examples)
+        request = {'model': model, 'examples': examples, 'done': threading.Event(), 'result': None, 'error': None}
+        self.queue.put(request)
+        request['done'].wait()
+        if request['error']:
+            raise(request['error'])
+        return request['result']
+
+    def update(self, add=[], remove=[]):
+        '''Add and remove facts, between batches'''
+        with self.lock:
+            for fact in remove:
+                self.store.remove(fact)
+            for fact in add:
+                self.store.add(fact)
+            return len(self.store)
+
+    def run_batches(self):
+        while True:
+            batch = [self.queue.get()]
+            # the batcher must survive any request, all of them wait for it
+            try:
+                size = len(batch[0]['examples'])
+                deadline = time.time() + self.max_wait
+                while size < self.max_batch:
+                    try:
+                        request = self.queue.get(timeout=max(deadline - time.time(), 0))
+                    except queue.Empty:
+                        break
+                    batch.append(request)
+                    size += len(request['examples'])
+                self.score_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request['done'].is_set():
+                        request['error'] = e
+                        request['done'].set()
+
+    def score_batch(self, batch):
+        '''Score the distinct examples of every request of a batch at once.
+        A request failing its checks or a model failing to score only fails
+        its own requests.'''
+        examples = {}
+        requests = {}
+        for request in batch:
+            try:
+                scoring_server.check_examples(request['examples'])
+            except Exception as e:
+                request['error'] = e
+                request['done'].set()
+                continue
+            examples.setdefault(request['model'], set()).update(request['examples'])
+            requests.setdefault(request['model'], []).append(request)
+        for model, items in examples.items():
+            try:
+                items = list(items)
+                with self.lock:
+                    probabilities = dict(zip(items, self.models[model].score(self.store, items)))
+                for request in requests[model]:
+                    request['result'] = [probabilities[example] for example in request['examples']]
+            except Exception as e:
+                for request in requests[model]:
+                    request['error'] = e
+            for request in requests[model]:
+                request['done'].set()
+
+    def serve(self, host='127.0.0.1', port=8000):
+        httpd = scoring_http_server((host, port), scoring_handler)
+        httpd.scoring = self
+        httpd.serve_forever()
+
+class scoring_http_server(ThreadingHTTPServer):
+    # the default backlog of 5 connections resets clients under load
+    request_queue_size = 1024
+    daemon_threads = True
+
+class scoring_handler(BaseHTTPRequestHandler):
+    '''HTTP interface of a scoring_server
+       POST /score {"model": target, "examples": [...]} -> {"probabilities": [...]}
+       POST /facts {"add": [...], "remove": [...]} -> {"facts": number of facts}
+       GET /histogram -> latency histogram of /score requests
+       GET /models -> loaded models and their number of trees'''
+
+    def reply(self, code, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        scoring = self.server.scoring
+        if self.path == '/histogram':
+            self.reply(200, scoring.histogram.to_dict())
+        elif self.path == '/models':
+            self.reply(200, dict((name, len(model.trees)) for name, model in scoring.models.items()))
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        scoring = self.server.scoring
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        except ValueError:
+            self.reply(400, {'error': 'Invalid JSON'})
+            return
+        if self.path in ['/facts', '/score'] and not isinstance(request, dict):
+            self.reply(400, {'error': 'Request should be a JSON object'})
+            return
+        if self.path == '/facts':
+            try:
+                scoring_server.check_facts(request.get('add', []))
+                scoring_server.check_facts(request.get('remove', []))
+            except Exception as e:
+                self.reply(400, {'error': str(e)})
+                return
+            self.reply(200, {'facts': scoring.update(add=request.get('add', []), remove=request.get('remove', []))})
+        elif self.path == '/score':
+            model = request.get('model', list(scoring.models)[0] if len(scoring.models) == 1 else None)
+            try:
+                if not isinstance(model, str) or model not in scoring.models:
+                    raise(Exception('Model ' + str(model) + ' is not loaded.'))
+                scoring_server.check_examples(request.get('examples'))
+            except Exception as e:
+                self.reply(400, {'error': str(e)})
+                return
+            if not scoring.slots.acquire(blocking=False):
+                self.reply(503, {'error': 'Too many requests'})
+                return
+            start = time.time()
+            try:
+                probabilities = scoring.score(model, request['examples'])
+            except Exception as e:
+                self.reply(400, {'error': str(e)})
+                return
+            finally:
+                scoring.slots.release()
+            scoring.histogram.add(time.time() - start)
+            self.reply(200, {'probabilities': probabilities})
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score examples with models learned by BoostSRL')
+    parser.add_argument('--model', action='append', required=True, help='target=path of the workspace or WILL file of a model')
+    parser.add_argument('--facts', help='file of facts loaded at start')
+    parser.add_argument('--database', help='SQLite file to keep facts in instead of memory, --facts are loaded only while it is empty')
+    parser.add_argument('--reload', action='store_true', help='delete the facts of --database before loading --facts')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-wait', type=float, default=0.005)
+    parser.add_argument('--max-concurrency', type=int, default=64)
+    args = parser.parse_args()
+    models = {}
+    for spec in args.model:
+        target, path = spec.split('=', 1)
+        models[target] = boosted_model(path, target)
+    facts = []
+    if args.facts:
+        with open(args.facts, 'r') as f:
+            facts = f.read().splitlines()
+    store = None
+    if args.database:
+        store = sqlite_store(args.database)
+        if args.reload:
+            store.clear()
+        # facts kept from a previous start would be inserted twice
+        if not len(store):
+            store.load(facts)
+        elif len(facts):
+            print('Database ' + args.database + ' already holds facts, --facts not loaded (use --reload to replace them)')
+    scoring_server(models, facts, max_batch=args.max_batch, max_wait=args.max_wait, max_concurrency=args.max_concurrency, store=store).serve(args.host, args.port)
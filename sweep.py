@@ -0,0 +1,124 @@
+'''
+   Hyperparameter sweep engine for BoostSRL settings
+   Name:         sweep.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import os
+import math
+import random
+import shutil
+import itertools
+
+from revision import *
+from curve import curve
+from tboostsrl import tboostsrl
+
+class sweep:
+    def grid(space):
+        '''Every combination of the values in space.
+        space maps 'trees' and tboostsrl.modes parameters (maxTreeDepth,
+        nodeSize, numOfClauses, ...) to the list of values to try.'''
+        keys = sorted(space)
+        return [dict(zip(keys, values)) for values in itertools.product(*[space[key] for key in keys])]
+
+    def sample(space, n_samples, seed=None):
+        '''n_samples distinct combinations of the values in space drawn at random'''
+        configs = sweep.grid(space)
+        return random.Random(seed).sample(configs, min(n_samples, len(configs)))
+
+    def get_settings(config):
+        '''Settings of a configuration in the format used by curve.learning_curve'''
+        modes = dict((key, value) for key, value in config.items() if key != 'trees')
+        return {'trees': config.get('trees', 10), 'modes': modes}
+
+    def run_job(job):
+        '''Learn and test one configuration on one fold in its own workspace'''
+        workspace = job['workspace']
+        settings = sweep.get_settings(job['config'])
+        print_function = job['print_function']
+        if print_function:
+            print_function('Configuration: %s, Fold: %s' % (job['config'], job['fold'] + 1))
+        background = tboostsrl.modes(job['background'], [job['target']], useStdLogicVariables=False, workspace=workspace, **settings['modes'])
+        [model, t_results, structured, will, variances] = revision.learn_test_model(background, tboostsrl, job['target'], job['train_pos'], job['train_neg'], job['train_facts'], job['test_pos'], job['test_neg'], job['test_facts'], trees=settings['trees'], print_function=print_function, cache=job['cache'])
+        shutil.rmtree(workspace, ignore_errors=True)
+        # pool workers exit without running atexit handlers
+        if hasattr(print_function, 'flush'):
+            print_function.flush()
+        return (job['id'], job['fold'], t_results)
+
+    def search(background, target, folds, space, strategy='grid', n_samples=10, eta=2, seed=None, workspace='tboostsrl/sweep', processes=1, cache=None, print_function=None):
+        '''Search the configuration of BoostSRL with the best mean CLL over folds.
+        folds is a list of dicts with train_pos, train_neg, train_facts,
+        test_pos, test_neg and test_facts. Facts of each fold are written
+        once and linked by every job, and jobs run concurrently in isolated
+        workspaces when processes > 1. Predictions are kept in cache, if given.
+        strategy is 'grid' (every combination of space), 'random'
+        (n_samples combinations) or 'halving' (successive halving of
+        n_samples combinations: after each fold only the 1/eta best
+        configurations by mean CLL so far are run on the next fold, the last
+        one being run on every fold as with the other strategies).
+        Returns a list of {'config', 'CLL', 'Folds', 'results'} from the best,
+        CLL being the mean over the Folds the configuration was run on.'''
+        if strategy == 'grid':
+            configs = sweep.grid(space)
+        elif strategy in ['random', 'halving']:
+            configs = sweep.sample(space, n_samples, seed=seed)
+        else:
+            raise(Exception('Unknown sweep strategy ' + str(strategy) + '.'))
+        shared = []
+        for i in range(len(folds)):
+            shared.append(curve.share_facts(os.path.join(workspace, 'facts_' + str(i+1)), folds[i]['train_facts'], folds[i]['test_facts']))
+        # halving runs one fold at a time, the others every fold at once
+        rungs = [[i] for i in range(len(folds))] if strategy == 'halving' else [list(range(len(folds)))]
+        results = dict((i, {'config': configs[i], 'CLL': [], 'results': {}}) for i in range(len(configs)))
+        alive = list(range(len(configs)))
+        pool = None
+        if processes > 1 and len(configs) * len(folds) > 1:
+            pool = curve.get_pool(processes)
+        try:
+            for rung in rungs:
+                if strategy == 'halving' and rung[0] > 0:
+                    alive.sort(key=lambda i: sum(results[i]['CLL']) / len(results[i]['CLL']), reverse=True)
+                    alive = alive[:int(math.ceil(len(alive) / eta))]
+                    if print_function:
+                        print_function('Configurations kept for fold %s: %s' % (rung[0] + 1, [configs[i] for i in alive]))
+                jobs = []
+                for i in alive:
+                    for fold in rung:
+                        jobs.append({
+                            'id': i,
+                            'fold': fold,
+                            'config': configs[i],
+                            'workspace': os.path.join(workspace, 'config_' + str(i) + '_fold_' + str(fold+1)),
+                            'background': background,
+                            'target': target,
+                            'train_pos': list(folds[fold]['train_pos']),
+                            'train_neg': list(folds[fold]['train_neg']),
+                            'train_facts': shared[fold][0],
+                            'test_pos': list(folds[fold]['test_pos']),
+                            'test_neg': list(folds[fold]['test_neg']),
+                            'test_facts': shared[fold][1],
+                            'cache': cache,
+                            'print_function': print_function
+                            })
+                if pool:
+                    outputs = pool.imap_unordered(sweep.run_job, jobs, chunksize=1)
+                else:
+                    outputs = (sweep.run_job(job) for job in jobs)
+                for i, fold, t_results in outputs:
+                    results[i]['CLL'].append(t_results['CLL'])
+                    results[i]['results'][fold] = t_results
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        shutil.rmtree(workspace, ignore_errors=True)
+        ret = [results[i] for i in results if len(results[i]['CLL'])]
+        for result in ret:
+            result['Folds'] = len(result['CLL'])
+            result['CLL'] = sum(result['CLL']) / len(result['CLL'])
+        # configurations run on more folds survived longer
+        ret.sort(key=lambda x: (x['Folds'], x['CLL']), reverse=True)
+        return ret
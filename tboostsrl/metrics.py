@@ -0,0 +1,125 @@
+'''
+   Metrics of BoostSRL results computed from per-example probabilities
+   Name:         metrics.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import numpy as np
+
+class metrics:
+    def counts(labels, probabilities):
+        '''Returns true and false positives when the threshold is set at each
+           distinct probability, from the highest to the lowest.'''
+        order = np.argsort(-probabilities, kind='mergesort')
+        probabilities = probabilities[order]
+        labels = labels[order]
+        # last position of each distinct probability
+        distinct = np.r_[np.nonzero(np.diff(probabilities))[0], len(labels) - 1]
+        tp = np.cumsum(labels)[distinct]
+        fp = (1 + distinct) - tp
+        return (tp, fp)
+
+    def area(x, y):
+        '''Area under a curve by the trapezoidal rule.'''
+        return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+
+    def auc_roc(labels, probabilities):
+        '''Area under the ROC curve, ties counting half.'''
+        labels = np.asarray(labels, dtype=np.int64)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        tp, fp = metrics.counts(labels, probabilities)
+        if not len(tp) or tp[-1] == 0 or fp[-1] == 0:
+            return 0.0
+        tpr = np.r_[0, tp] / tp[-1]
+        fpr = np.r_[0, fp] / fp[-1]
+        return metrics.area(fpr, tpr)
+
+    def auc_pr(labels, probabilities):
+        '''Area under the precision-recall curve, interpolating between
+           thresholds as in Davis and Goadrich (2006) like the auc.jar helper.'''
+        labels = np.asarray(labels, dtype=np.int64)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        tp, fp = metrics.counts(labels, probabilities)
+        if not len(tp) or tp[-1] == 0:
+            return 0.0
+        # the curve starts at recall 0 with the precision of the first threshold
+        tp = np.r_[0, tp]
+        fp = np.r_[0, fp]
+        steps = np.diff(tp)
+        # one point for each true positive between consecutive thresholds,
+        # and one for thresholds that only add false positives
+        points = np.maximum(steps, 1)
+        offset = np.arange(points.sum()) - np.repeat(np.cumsum(points) - points, points) + 1
+        x = np.repeat(tp[:-1], points) + offset * np.repeat(steps / points, points)
+        y = np.repeat(fp[:-1], points) + offset * np.repeat(np.diff(fp) / points, points)
+        recall = np.r_[0, x / tp[-1]]
+        precision = x / (x + y)
+        precision = np.r_[precision[0], precision]
+        return metrics.area(recall, precision)
+
+    def cll(labels, probabilities, epsilon=1e-5):
+        '''Conditional log likelihood averaged over examples.'''
+        labels = np.asarray(labels, dtype=np.int64)
+        probabilities = np.clip(np.asarray(probabilities, dtype=np.float64), epsilon, 1 - epsilon)
+        if not len(labels):
+            return 0.0
+        return float(np.mean(np.where(labels == 1, np.log(probabilities), np.log(1 - probabilities))))
+
+    def precision_recall_f1(labels, probabilities, threshold=0.5):
+        '''Precision, recall and F1 of examples predicted positive when
+           their probability is at least threshold.'''
+        labels = np.asarray(labels, dtype=np.int64)
+        predicted = np.asarray(probabilities, dtype=np.float64) >= threshold
+        tp = float(np.sum(predicted & (labels == 1)))
+        precision = tp / predicted.sum() if predicted.sum() else 0.0
+        recall = tp / (labels == 1).sum() if (labels == 1).sum() else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return (float(precision), float(recall), float(f1))
+
+    def summarize(labels, probabilities, threshold=0.5):
+        '''Returns the metrics of test.summarize_results.'''
+        precision, recall, f1 = metrics.precision_recall_f1(labels, probabilities, threshold=threshold)
+        return {
+            'AUC ROC': metrics.auc_roc(labels, probabilities),
+            'AUC PR': metrics.auc_pr(labels, probabilities),
+            'CLL': metrics.cll(labels, probabilities),
+            'Precision': [precision, threshold],
+            'Recall': recall,
+            'F1': f1
+        }
+
+    def prefixes(labels, contributions, threshold=0.5):
+        '''Returns the metrics of summarize for every prefix of 1..N trees
+           of a boosted model, from the contribution of each tree to each
+           example (examples x trees) as given by evaluation.contributions.'''
+        psi = np.cumsum(np.asarray(contributions, dtype=np.float64), axis=1)
+        probabilities = np.exp(-np.logaddexp(0, -psi))
+        return [metrics.summarize(labels, probabilities[:, k], threshold=threshold) for k in range(psi.shape[1])]
+
+    def bootstrap(labels, probabilities, metric, n_samples=1000, alpha=0.05, seed=None):
+        '''Returns the (lower, upper) bootstrap confidence interval of a metric
+           and the number of resamples dropped for having a single class,
+           e.g. metrics.bootstrap(labels, probabilities, metrics.auc_roc).'''
+        labels = np.asarray(labels)
+        probabilities = np.asarray(probabilities)
+        rng = np.random.default_rng(seed)
+        samples = rng.integers(0, len(labels), size=(n_samples, len(labels)))
+        # ranking metrics are undefined without both classes
+        values = np.array([metric(labels[sample], probabilities[sample]) if len(np.unique(labels[sample])) == 2 else np.nan for sample in samples], dtype=np.float64)
+        dropped = int(np.isnan(values).sum())
+        if dropped == n_samples:
+            return (float('nan'), float('nan'), dropped)
+        return (float(np.nanquantile(values, alpha / 2)), float(np.nanquantile(values, 1 - alpha / 2)), dropped)
+
+    def aggregate(results):
+        '''Returns the mean and standard deviation of each metric over folds.
+           results is a list of dicts as returned by summarize.'''
+        ret = {}
+        for key in results[0]:
+            values = [result[key][0] if isinstance(result[key], list) else result[key] for result in results]
+            if not all(isinstance(value, (int, float)) for value in values):
+                continue
+            values = np.array(values, dtype=np.float64)
+            ret[key] = {'mean': float(values.mean()), 'std': float(values.std())}
+        return ret
@@ -0,0 +1,93 @@
+'''
+   Modes of a background compiled once and shared by every parser of modes
+   Name:         schema.py
+   Updated:      October 19, 2026
+   License:      GPLv3
+'''
+
+import re
+
+# Mode definitions can be verified with regular expressions.
+mode_re = re.compile(r'[a-zA-Z0-9]*\(((\+|\-|\#|\`)[a-zA-Z0-9]*,( )*)*(\+|\-|\#|\`)[a-zA-Z0-9]*\)\.')
+# Predicate, flagged argument types of a mode.
+mode_parse_re = re.compile(r'^(\w+)\(([\w, +\-\#\`]+)*\).$')
+# Predicate of any declaration, as accepted by datasets.load.
+name_re = re.compile(r'^(\w+)\(.*\).$')
+
+# Schemas already compiled in this process, by background.
+compiled = {}
+
+class schema(object):
+    '''Modes of a background parsed once into predicate ids, arities,
+       argument types and mode flags (+, -, # or `).
+       Example:
+          schema(['publication(-title,+person).', 'professor(+person).'])
+          ids:    {'publication': 0, 'professor': 1}
+          types:  {'publication': ['title', 'person'], 'professor': ['person']}
+          flags:  {'publication': [['-', '+']], 'professor': [['+']]}
+       Schemas only hold builtin types, so they can be pickled to workers.
+    '''
+
+    def __init__(self, background):
+        self.background = tuple(background)
+        self.ids = {}
+        self.types = {}
+        self.flags = {}
+        # declarations without flags, 'publication(title,person).'
+        self.declarations = []
+        # declarations without + - ` flags, as in transfer files
+        self.transfer_declarations = []
+        # predicate names accepted when loading datasets
+        self.accepted = set()
+        # modes that fail inspect_mode_syntax
+        self.invalid = []
+        for line in self.background:
+            if not mode_re.search(line):
+                self.invalid.append(line)
+            m = name_re.search(line)
+            if m:
+                self.accepted.add(re.sub('[ _]', '', m.group(1)))
+            unflagged = re.sub('[\+\-\`]', '', line)
+            if unflagged not in self.transfer_declarations:
+                self.transfer_declarations.append(unflagged)
+            m = mode_parse_re.search(line)
+            if m and m.group(2) is not None:
+                relation = m.group(1)
+                args = [arg.strip() for arg in m.group(2).split(',')]
+                types = [re.sub('[+\-\#\` ]', '', arg) for arg in args]
+                self.ids.setdefault(relation, len(self.ids))
+                self.types[relation] = types
+                self.flags.setdefault(relation, []).append([arg[:1] for arg in args])
+                declaration = relation + '(' + ','.join(types) + ').'
+                if declaration not in self.declarations:
+                    self.declarations.append(declaration)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, relation):
+        return relation in self.ids
+
+    def arity(self, relation):
+        '''Number of arguments of a predicate, 0 if it has no mode'''
+        return len(self.types.get(relation, []))
+
+    def declaration(self, relation):
+        '''Declaration of a predicate without flags, None if it has no mode'''
+        if relation not in self.types:
+            return None
+        return relation + '(' + ','.join(self.types[relation]) + ').'
+
+    def all_types(self):
+        '''Set of argument types of every predicate'''
+        return set(t for types in self.types.values() for t in types)
+
+def get_schema(background):
+    '''Returns the schema of a background, compiled once per process.
+       A schema is returned as it is.'''
+    if isinstance(background, schema):
+        return background
+    key = tuple(background)
+    if key not in compiled:
+        compiled[key] = schema(key)
+    return compiled[key]
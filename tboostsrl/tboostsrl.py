@@ -11,18 +11,32 @@
 '''
 
 from __future__ import print_function
+import hashlib
 import os
 import re
+import shutil
+import signal
 import sys
+import time
+import numpy as np
+
+from tboostsrl.metrics import metrics
+from tboostsrl.schema import mode_re, schema, get_schema
 
 if os.name == 'posix' and sys.version_info[0] < 3:
     import subprocess32 as subprocess
 else:
     import subprocess
 
-# Mode definitions and predicate logic examples can be verified with regular expressions.
-mode_re = re.compile(r'[a-zA-Z0-9]*\(((\+|\-|\#|\`)[a-zA-Z0-9]*,( )*)*(\+|\-|\#|\`)[a-zA-Z0-9]*\)\.')
+# Location of the BoostSRL jars, used when jobs run in other workspaces.
+__location__ = os.path.dirname(os.path.realpath(__file__))
+
+# Mode definitions (see schema) and predicate logic examples can be verified with regular expressions.
 exam_re = re.compile(r'[a-zA-Z0-9]*\(([a-zA-Z0-9]*,( )*)*[a-zA-Z0-9]*\)\.')
+# A text where every line is an example, checking a whole set in one pass.
+# The groups of exam_re are not captured, which makes the pass about twice as fast.
+exam_line = r'[a-zA-Z0-9]*\((?:[a-zA-Z0-9]*, *)*[a-zA-Z0-9]*\)\.'
+exam_text_re = re.compile(r'(?:' + exam_line + r'\n)*' + exam_line)
 
 def results_to_float(string):
     '''Results can be printed with comma format.'''
@@ -62,13 +76,116 @@ def example_data(example):
     else:
         raise(Exception('Attempted to use sample data that does not exist.'))
 
-def call_process(call):
-    '''Create a subprocess and wait for it to finish. Error out if errors occur.'''
+# Heap of the JVM in MB: a base plus MB per fact and per example, or a fixed 'heap'.
+# Profiles of datasets can be added here and chosen with modes(profile=...).
+jvm_profiles = {
+    'default': {'base': 512, 'fact': 0.002, 'example': 0.01}
+}
+
+def heap_size(n_facts, n_examples, profile=None):
+    '''Returns the heap in MB for a job with n_facts facts and n_examples examples,
+       given a profile name in jvm_profiles or a profile dict, at most 90% of the
+       physical memory.'''
+    if not isinstance(profile, dict):
+        profile = jvm_profiles.get(profile, jvm_profiles['default'])
+    heap = profile['heap'] if 'heap' in profile else profile['base'] + profile['fact'] * n_facts + profile['example'] * n_examples
     try:
-        p = subprocess.Popen(call, shell=True)
-        os.waitpid(p.pid, 0)
+        physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+        heap = min(heap, 0.9 * physical)
+    except (AttributeError, ValueError, OSError):
+        pass
+    return int(heap)
+
+def java_command(n_facts, n_examples, heap=None, profile=None):
+    '''Returns the command running the BoostSRL jar with the given heap in MB,
+       or sized by profile. Without either the JVM defaults are used.'''
+    if heap is None and profile is not None:
+        heap = heap_size(n_facts, n_examples, profile=profile)
+    return 'java ' + ('-Xmx' + str(int(heap)) + 'm ' if heap else '') + '-jar ' + os.path.join(__location__, 'v1-0.jar')
+
+def session_peak_rss(sid):
+    '''Largest peak resident memory in MB of the processes of a session, read from /proc.
+       VmHWM is counted from the exec of each process, so unlike ru_maxrss it does not
+       include the memory a child inherits from the Python process that forked it.'''
+    peak = 0
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/' + name + '/stat', 'r') as f:
+                stat = f.read()
+            # state, ppid, pgrp and session follow the command, which can hold spaces
+            if int(stat[stat.rindex(')') + 2:].split()[3]) != sid:
+                continue
+            with open('/proc/' + name + '/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak = max(peak, int(line.split()[1]) / 1024)
+        except (OSError, ValueError, IndexError):
+            # the process exited while it was read
+            pass
+    return peak
+
+def call_process(call, timeout=None):
+    '''Create a subprocess and wait for it to finish. Error out if errors occur,
+       including a non-zero exit code. The process is killed with its children after
+       timeout seconds. Returns its exit code, wall time, CPU time and peak resident
+       memory in MB. Where /proc is available the peak is the largest VmHWM of the
+       processes started, sampled while they run, otherwise ru_maxrss is used, which
+       also counts the memory of this process inherited before exec.'''
+    start = time.time()
+    try:
+        p = subprocess.Popen(call, shell=True, start_new_session=True)
     except:
         raise(Exception('Encountered problems while running process: ', call))
+    if not hasattr(os, 'wait4'):
+        try:
+            p.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+            raise(Exception('Process timed out after ' + str(timeout) + ' seconds: ' + call))
+        check_exit_code(p.returncode, call)
+        return {'Exit code': p.returncode, 'Wall time': time.time() - start}
+    sample = os.path.isdir('/proc')
+    peak = 0
+    delay = 0.01
+    while True:
+        if sample:
+            peak = max(peak, session_peak_rss(p.pid))
+        pid, status, rusage = os.wait4(p.pid, os.WNOHANG if timeout or sample else 0)
+        if pid:
+            break
+        if timeout and time.time() - start > timeout:
+            # the shell, java and anything they started are in the same process group
+            for sig in [signal.SIGTERM, signal.SIGKILL]:
+                try:
+                    os.killpg(p.pid, sig)
+                except ProcessLookupError:
+                    pass
+                deadline = time.time() + 5
+                while time.time() < deadline:
+                    pid, status, rusage = os.wait4(p.pid, os.WNOHANG)
+                    if pid:
+                        break
+                    time.sleep(0.05)
+                if pid:
+                    break
+            raise(Exception('Process timed out after ' + str(timeout) + ' seconds: ' + call))
+        time.sleep(delay)
+        delay = min(2 * delay, 1.0)
+    # Popen must not wait for a process that was already reaped
+    p.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+    check_exit_code(p.returncode, call)
+    if not sample:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        peak = rusage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else rusage.ru_maxrss / 1024
+    return {'Exit code': p.returncode, 'Wall time': time.time() - start, 'CPU time': rusage.ru_utime + rusage.ru_stime, 'Peak RSS': peak}
+
+def check_exit_code(code, call):
+    '''Error out if a process did not exit successfully, e.g. a JVM out of memory.'''
+    if code != 0:
+        raise(Exception('Process exited with code ' + str(code) + ': ' + call))
 
 def inspect_mode_syntax(example):
     '''Uses a regular expression to check whether all of the examples in a list are in the correct form.
@@ -91,6 +208,33 @@ def inspect_example_syntax(example):
     if not exam_re.search(example):
         raise(Exception('Error when checking example; incorrect syntax: ' + example))
 
+def inspect_text_syntax(text):
+    '''Checks every line of a text of examples in a single pass of exam_text_re.
+       Only when a line is not exactly an example are lines checked one by one.'''
+    if exam_text_re.fullmatch(text):
+        return
+    for line in text.split('\n'):
+        inspect_example_syntax(line)
+
+def inspect_examples_syntax(examples):
+    '''Checks a whole set of examples at once.
+       Sets that can hold attributes (fold views, facts files) are marked as validated
+       and are not checked again.'''
+    if getattr(examples, 'validated', False) or not len(examples):
+        return
+    inspect_text_syntax('\n'.join(examples))
+    try:
+        examples.validated = True
+    except AttributeError:
+        pass
+
+def inspect_file_syntax(path):
+    '''Checks every example written in a file in a single pass.'''
+    with open(path, 'r') as f:
+        text = f.read()
+    if text:
+        inspect_text_syntax(text[:-1] if text.endswith('\n') else text)
+
 def write_to_file(content, path):
     '''Takes a list (content) and a path/file (path) and writes each line of the list to the file location.'''
     with open(path, 'w') as f:
@@ -98,6 +242,132 @@ def write_to_file(content, path):
             f.write(line + '\n')
     f.close()
 
+def write_examples(content, path):
+    '''Writes examples to path, linking them instead when they are already in a facts_file.'''
+    if isinstance(content, facts_file):
+        content.link(path)
+    else:
+        write_to_file(content, path)
+
+def hash_file(path, h):
+    '''Updates hash h with the content of a file.'''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+def hash_examples(examples):
+    '''Returns a hash of a set of examples, computed only once for a facts_file.'''
+    if isinstance(examples, facts_file):
+        return examples.hash
+    h = hashlib.sha1()
+    for example in examples:
+        h.update(example.encode('utf-8') + b'\n')
+    return h.hexdigest()
+
+def hash_model(workspace):
+    '''Returns a hash of the model files learned in a workspace.'''
+    h = hashlib.sha1()
+    models = os.path.join(workspace, 'train/models')
+    for root, dirs, files in os.walk(models):
+        dirs.sort()
+        for name in sorted(files):
+            h.update(os.path.relpath(os.path.join(root, name), models).encode('utf-8'))
+            hash_file(os.path.join(root, name), h)
+    return h.hexdigest()
+
+def example_key(example):
+    '''Normalizes an example so that results lines can be matched to examples.'''
+    return example.strip().lstrip('!').rstrip('.').replace(' ', '')
+
+def relevant_facts(background, examples, facts, depth=None):
+    '''Returns the facts that can be reached from the constants of examples
+       following the mode declarations in background, chaining at most depth
+       literals (all reachable facts when depth is None).
+       A literal is reachable when the constants of its + arguments are, and
+       makes the constants of its - arguments reachable; # and ` arguments
+       are not followed. Types are not checked, so a superset of the facts
+       the learner can use is kept. Facts of predicates without modes, or without
+       a mode of their arity, are kept as they are.
+       Example:
+          modes:    publication(-title,+person).  publication(+title,-person).  professor(+person).
+          examples: advisedby(bob, ann).
+          facts:    publication(t1, bob).  publication(t1, tom).  professor(ann).  professor(tom).
+          with depth 1 publication(t1, bob). and professor(ann). are kept, with depth 2
+          also publication(t1, tom)., t1 being reached, and with depth 3 professor(tom).
+    '''
+    modes = get_schema(background).flags
+    def parse(example):
+        match = re.match(r'\s*!?(\w+)\((.*)\)\.', example)
+        return (match.group(1), [arg.strip() for arg in match.group(2).split(',')]) if match else (None, [])
+    known = set()
+    for example in examples:
+        known.update(parse(example)[1])
+    selected = [False] * len(facts)
+    parsed = []
+    # (fact, mode) pairs triggered by each constant in an input argument
+    index = {}
+    pending = []
+    for i, fact in enumerate(facts):
+        name, args = parse(fact)
+        parsed.append(args)
+        arity_modes = [mode for mode in modes.get(name, []) if len(mode) == len(args)]
+        if not len(arity_modes):
+            selected[i] = True
+            continue
+        for mode in arity_modes:
+            inputs = [j for j in range(len(mode)) if mode[j] == '+']
+            if not len(inputs):
+                pending.append((i, mode))
+            for j in inputs:
+                index.setdefault(args[j], []).append((i, mode))
+    frontier = set(known)
+    level = 0
+    while (len(frontier) or len(pending)) and (depth is None or level < depth):
+        for constant in frontier:
+            pending += index.pop(constant, [])
+        new = set()
+        for i, mode in pending:
+            args = parsed[i]
+            if all(args[j] in known for j in range(len(mode)) if mode[j] == '+'):
+                selected[i] = True
+                new.update(args[j] for j in range(len(mode)) if mode[j] == '-' and args[j] not in known)
+        pending = []
+        known.update(new)
+        frontier = new
+        level += 1
+    return [facts[i] for i in range(len(facts)) if selected[i]]
+
+class facts_file(object):
+    '''Facts written and checked once, then linked into the train or test folder
+       of every job that uses them instead of being rewritten each time.'''
+
+    def __init__(self, facts, path):
+        write_to_file(facts, path)
+        inspect_file_syntax(path)
+        self.validated = True
+        self.path = os.path.abspath(path)
+        self.size = len(facts)
+        h = hashlib.sha1()
+        hash_file(self.path, h)
+        self.hash = h.hexdigest()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    def link(self, path):
+        '''Make path point to the facts, copying them if a hard link is not possible.'''
+        if os.path.lexists(path):
+            os.remove(path)
+        try:
+            os.link(self.path, path)
+        except OSError:
+            shutil.copyfile(self.path, path)
+
 '''
 def build_bridges(target, bk):
 I'm experimenting with whether bridgers can be set automatically. I'll experiment with the ability here.
@@ -121,9 +391,18 @@ class modes(object):
     def __init__(self, background, target, bridgers=None, precomputes=None, loadAllLibraries=False,
                  useStdLogicVariables=False, usePrologVariables=False,
                  recursion=False, lineSearch=False, resampleNegs=False,
-                 treeDepth=None, maxTreeDepth=None, nodeSize=None, numOfClauses=None, numOfCycles=None, minLCTrees=None, incrLCTrees=None):
+                 treeDepth=None, maxTreeDepth=None, nodeSize=None, numOfClauses=None, numOfCycles=None, minLCTrees=None, incrLCTrees=None,
+                 workspace='tboostsrl', relevant_facts=False, heap=None, profile=None, timeout=None):
         '''
+        background: a list of modes or its schema (see schema.get_schema).
         target: a list of predicate heads that learning/inference will be performed on.
+        workspace: folder where the background, train and test files of the job are written.
+        relevant_facts: write only the facts reachable from the examples under the modes,
+                        down to maxTreeDepth * nodeSize literals (see relevant_facts).
+        heap: maximum heap of the JVM in MB.
+        profile: name in jvm_profiles or dict used to size the heap from the number
+                 of facts and examples when heap is not given (see heap_size).
+        timeout: seconds after which learning or inference is killed.
         '''
         self.target = target
 
@@ -149,7 +428,7 @@ class modes(object):
         # Many of the arguments in the modes object are optional this shows us the values of the ones that are neither false nor none
 
         types = {
-            'background should be a list.': isinstance(background, list),
+            'background should be a list.': isinstance(background, (list, schema)),
             'target should be a list.': isinstance(target, list),
             'bridgers should be a list.': isinstance(bridgers, list) or bridgers is None,
             'precomputes should be a dictionary.': isinstance(precomputes, dict) or precomputes is None,
@@ -190,8 +469,11 @@ class modes(object):
                 s = 'setParam: ' + a + '=' + str(v) + '.'
                 background_knowledge.append(s)
 
-        for pred in background:
+        # modes are parsed and checked once per background
+        background = get_schema(background)
+        for pred in background.invalid:
             inspect_mode_syntax(pred)
+        for pred in background.background:
             background_knowledge.append('mode: ' + pred)
 
         if self.bridgers is not None:
@@ -204,8 +486,16 @@ class modes(object):
                 background_knowledge.append('mode: ' + precompute)
 
         # Write the newly created background_knowledge to a file: background.txt
+        # workspace is set only now so that it is not written as a parameter
         self.background_knowledge = background_knowledge
-        write_to_file(background_knowledge, 'tboostsrl/background.txt')
+        self.workspace = workspace
+        self.background = background
+        self.relevant_facts = relevant_facts
+        self.heap = heap
+        self.profile = profile
+        self.timeout = timeout
+        os.makedirs(workspace, exist_ok=True)
+        write_to_file(background_knowledge, os.path.join(workspace, 'background.txt'))
 
 class train(object):
 
@@ -214,6 +504,7 @@ class train(object):
         background: list of strings representing background knowledge.
         '''
         self.target = background.target
+        self.workspace = background.workspace
         self.train_pos = train_pos
         self.train_neg = train_neg
         self.train_facts = train_facts
@@ -224,35 +515,42 @@ class train(object):
         self.trees = trees
 
         # Syntax checking for examples in each set.
-        for example in self.train_pos:
-            inspect_example_syntax(example)
-        for example in self.train_neg:
-            inspect_example_syntax(example)
-        for example in self.train_facts:
-            inspect_example_syntax(example)
+        inspect_examples_syntax(self.train_pos)
+        inspect_examples_syntax(self.train_neg)
+        inspect_examples_syntax(self.train_facts)
+
+        # Keep only facts reachable from the examples, also used in inference
+        self.relevant = None
+        if getattr(background, 'relevant_facts', False):
+            depth = background.maxTreeDepth * background.nodeSize if background.maxTreeDepth and background.nodeSize else None
+            self.relevant = (background.background, depth)
+            self.train_facts = relevant_facts(background.background, list(self.train_pos) + list(self.train_neg), list(self.train_facts), depth=depth)
 
         # Create train folder if it does not exist
-        os.makedirs('tboostsrl/train', exist_ok=True)
+        os.makedirs(os.path.join(self.workspace, 'train'), exist_ok=True)
         # Write train_bk
-        write_to_file(['import: "../background.txt".'], 'tboostsrl/train/train_bk.txt')
+        write_to_file(['import: "../background.txt".'], os.path.join(self.workspace, 'train/train_bk.txt'))
 
         # Write refine.txt if presented
         if refine:
-            write_to_file(refine, 'tboostsrl/refine.txt')
+            write_to_file(refine, os.path.join(self.workspace, 'refine.txt'))
 
         # Write transfer.txt if presented
         if transfer:
-            write_to_file(transfer, 'tboostsrl/transfer.txt')
+            write_to_file(transfer, os.path.join(self.workspace, 'transfer.txt'))
 
-        write_to_file(self.train_pos, 'tboostsrl/train/train_pos.txt')
-        write_to_file(self.train_neg, 'tboostsrl/train/train_neg.txt')
-        write_to_file(self.train_facts, 'tboostsrl/train/train_facts.txt')
+        write_examples(self.train_pos, os.path.join(self.workspace, 'train/train_pos.txt'))
+        write_examples(self.train_neg, os.path.join(self.workspace, 'train/train_neg.txt'))
+        write_examples(self.train_facts, os.path.join(self.workspace, 'train/train_facts.txt'))
 
         combine = '' #'-combine ' if self.trees > 1 else ''
 
-        CALL = '(cd tboostsrl; java -jar v1-0.jar -l ' + ('-refine refine.txt ' if refine else '') + ('-transfer transfer.txt ' if transfer else '') + combine + '-train train/ -target ' + ','.join(self.target) + \
+        # inference is run with the same JVM settings
+        self.jvm = {'heap': getattr(background, 'heap', None), 'profile': getattr(background, 'profile', None), 'timeout': getattr(background, 'timeout', None)}
+        java = java_command(len(self.train_facts), len(self.train_pos) + len(self.train_neg), heap=self.jvm['heap'], profile=self.jvm['profile'])
+        CALL = '(cd ' + self.workspace + '; ' + java + ' -l ' + ('-refine refine.txt ' if refine else '') + ('-transfer transfer.txt ' if transfer else '') + combine + '-train train/ -target ' + ','.join(self.target) + \
                ' -trees ' + str(self.trees) + ' > train_output.txt 2>&1)'
-        call_process(CALL)
+        self.usage = call_process(CALL, timeout=self.jvm['timeout'])
 
     def tree(self, treenumber, target, image=False):
         # Tree number is between 0 and the self.trees.
@@ -263,20 +561,20 @@ class train(object):
             Writing this with Jupyter notebooks in mind.
             '''
             from graphviz import Source
-            tree_file = 'tboostsrl/train/models/bRDNs/dotFiles/WILLTreeFor_' + target + str(treenumber) + '.dot' if self.trees == 1 else 'tboostsrl/train/models/bRDNs/dotFiles/CombinedTrees' + target + '.dot'
+            tree_file = os.path.join(self.workspace, 'train/models/bRDNs/dotFiles/WILLTreeFor_' + target + str(treenumber) + '.dot' if self.trees == 1 else 'train/models/bRDNs/dotFiles/CombinedTrees' + target + '.dot')
             with open(tree_file, 'r') as f:
                 tree_output = ''.join(f.read().splitlines())
             src = Source(tree_output)
             return src
         else:
-            tree_file = 'tboostsrl/train/models/bRDNs/Trees/' + target + 'Tree' + str(treenumber) + '.tree'
+            tree_file = os.path.join(self.workspace, 'train/models/bRDNs/Trees/' + target + 'Tree' + str(treenumber) + '.tree')
             with open(tree_file, 'r') as f:
                 tree_output = f.read()
             return tree_output
 
     def get_training_time(self):
         '''Return the training time as a float representing the total number of seconds seconds.'''
-        with open('tboostsrl/train_output.txt', 'r') as f:
+        with open(os.path.join(self.workspace, 'train_output.txt'), 'r') as f:
             text = f.read()
         line = re.findall(r'% Total learning time \(\d* trees\):.*', text)
         # Remove the last character "." from the line and split it on spaces.
@@ -307,7 +605,7 @@ class train(object):
 
     def get_variances(self, treenumber=1):
         '''Return variances of nodes'''
-        with open('tboostsrl/train/train_learn_dribble.txt', 'r') as f:
+        with open(os.path.join(self.workspace, 'train/train_learn_dribble.txt'), 'r') as f:
             text = f.read()
         line = re.findall(r'% Path: '+ str(treenumber-1) + ';([\w,]*)\sComparing variance: ([\d.\w\-]*) .*\sComparing variance: ([\d.\w\-]*) .*', text)
         ret = {}
@@ -318,85 +616,172 @@ class train(object):
     def get_will_produced_tree(self, treenumber=1):
         '''Return the WILL-Produced Tree'''
         combine = 'Combined' if self.trees > 1 and treenumber=='combine' else '#' + str(treenumber)
-        with open('tboostsrl/train/models/WILLtheories/' + self.target[0] + '_learnedWILLregressionTrees.txt', 'r') as f:
+        with open(os.path.join(self.workspace, 'train/models/WILLtheories/' + self.target[0] + '_learnedWILLregressionTrees.txt'), 'r') as f:
             text = f.read()
-        line = re.findall(r'%%%%%  WILL-Produced Tree '+ combine +' .* %%%%%[\s\S]*% Clauses:', text)
-        splitline = (line[0].split('\n'))[2:]
-        for i in range(len(splitline)):
-            if splitline[i] == '% Clauses:':
-                return splitline[:i-2]
+        return will_produced_tree(text, combine)
 
     def get_structured_tree(self, treenumber=1):
         '''Use the get_will_produced_tree function to get the WILL-Produced Tree #1
            and returns it as objects with nodes, std devs and number of examples reached.'''
-        def get_results(groups):
-            #std dev, neg, pos
-            # std dev with comma, is this supposed to happen?
-            ret = [results_to_float(groups[0]), 0, 0]
-            if len(groups) > 1:
-                match = re.findall(r'\#pos=([\d.]*).*', groups[1])
-                if match:
-                    ret[2] = examples_to_float(match[0])
-                match = re.findall(r'\#neg=([\d.]*)', groups[1])
-                if match:
-                    ret[1] = examples_to_float(match[0])
-            return ret
-
-        lines = self.get_will_produced_tree(treenumber=treenumber)
-        current = []
-        stack = []
-        target = None
-        nodes = {}
-        leaves = {}
-
-        for line in lines:
-            if not target:
-                match = re.match('\s*\%\s*FOR\s*(\w+\([\w,\s]*\)):', line)
-                if match:
-                    target = match.group(1)
-            match = re.match('.*if\s*\(\s*([\w\(\),\s]*)\s*\).*', line)
+        return parse_will_tree(self.get_will_produced_tree(treenumber=treenumber))[:3]
+
+    def get_leaf_values(self, treenumber=1):
+        '''Return the regression value of each leaf of a tree.'''
+        return parse_will_tree(self.get_will_produced_tree(treenumber=treenumber))[3]
+
+def will_produced_tree(text, tree):
+    '''Return the lines of a WILL-Produced Tree (tree is '#n' or 'Combined')
+       of a learnedWILLregressionTrees text.'''
+    line = re.findall(r'%%%%%  WILL-Produced Tree '+ tree +' .* %%%%%[\s\S]*% Clauses:', text)
+    splitline = (line[0].split('\n'))[2:]
+    for i in range(len(splitline)):
+        if splitline[i] == '% Clauses:':
+            return splitline[:i-2]
+
+def parse_will_tree(lines):
+    '''Parse the lines of a WILL-Produced Tree into its target, nodes, leaves
+       (std dev, neg and pos examples reached) and leaf regression values.'''
+    def get_results(groups):
+        #std dev, neg, pos
+        # std dev with comma, is this supposed to happen?
+        ret = [results_to_float(groups[0]), 0, 0]
+        if len(groups) > 1:
+            match = re.findall(r'\#pos=([\d.]*).*', groups[1])
+            if match:
+                ret[2] = examples_to_float(match[0])
+            match = re.findall(r'\#neg=([\d.]*)', groups[1])
+            if match:
+                ret[1] = examples_to_float(match[0])
+        return ret
+
+    current = []
+    stack = []
+    target = None
+    nodes = {}
+    leaves = {}
+    values = {}
+
+    for line in lines:
+        if not target:
+            match = re.match('\s*\%\s*FOR\s*(\w+\([\w,\s]*\)):', line)
             if match:
-                nodes[','.join(current)] = match.group(1).strip()
-                stack.append(current+['false'])
-                current.append('true')
-            match = re.match('.*[then|else] return .*;\s*\/\/\s*std dev\s*=\s*([\d,.\-e]*),.*\/\*\s*(.*)\s*\*\/.*', line)
+                target = match.group(1)
+        match = re.match('.*if\s*\(\s*([\w\(\),\s]*)\s*\).*', line)
+        if match:
+            nodes[','.join(current)] = match.group(1).strip()
+            stack.append(current+['false'])
+            current.append('true')
+        value = re.match('.*[then|else] return\s*([\d,.\-eE]+)\s*;', line)
+        if value:
+            values[','.join(current)] = results_to_float(value.group(1))
+        match = re.match('.*[then|else] return .*;\s*\/\/\s*std dev\s*=\s*([\d,.\-e]*),.*\/\*\s*(.*)\s*\*\/.*', line)
+        if match:
+            leaves[','.join(current)] = get_results(match.groups()) #float(match.group(1))
+            if len(stack):
+                current = stack.pop()
+        else:
+            match = re.match('.*[then|else] return .*;\s*\/\/\s*.*', line)
             if match:
-                leaves[','.join(current)] = get_results(match.groups()) #float(match.group(1))
+                leaves[','.join(current)] = get_results(['0'] + list(match.groups())) #float(match.group(1))
                 if len(stack):
                     current = stack.pop()
-            else:
-                match = re.match('.*[then|else] return .*;\s*\/\/\s*.*', line)
-                if match:
-                    leaves[','.join(current)] = get_results(['0'] + list(match.groups())) #float(match.group(1))
-                    if len(stack):
-                        current = stack.pop()
-        return [target, nodes, leaves]
+    return [target, nodes, leaves, values]
 
 class test(object):
 
-    # Possibly a partial fix to Issue #3: checking for the .aucTemp.txt.lock
-    if os.path.isfile('tboostsrl/test/AUC/.aucTemp.txt.lock'):
-        print('Found lock file tboostsrl/test/AUC/.aucTemp.txt.lock, removing it:')
-        os.remove('tboostsrl/test/AUC/.aucTemp.txt.lock')
+    def __init__(self, model, test_pos, test_neg, test_facts, trees=1, cache=None):
+        '''
+        cache: folder where predictions are kept, keyed by the hashes of the model
+               and the test set. Inference is not run again for a cached key.
+        '''
+        self.workspace = model.workspace
+        self.target = model.target
+        self.test_pos = test_pos
+        self.predictions_arrays = {}
+
+        # Possibly a partial fix to Issue #3: checking for the .aucTemp.txt.lock
+        lock = os.path.join(self.workspace, 'test/AUC/.aucTemp.txt.lock')
+        if os.path.isfile(lock):
+            print('Found lock file ' + lock + ', removing it:')
+            os.remove(lock)
+
+        # resources used by inference, none when predictions are cached
+        self.usage = {}
+        self.cache_path = None
+        if cache:
+            key = hashlib.sha1((hash_model(self.workspace) + hash_examples(test_pos) + hash_examples(test_neg) + hash_examples(test_facts) + str(trees)).encode('utf-8')).hexdigest()
+            self.cache_path = os.path.join(cache, key + '.npz')
+            if os.path.isfile(self.cache_path):
+                self.load_cache()
+                return
 
-    def __init__(self, model, test_pos, test_neg, test_facts, trees=1):
         # Create train folder if it does not exist
-        os.makedirs('tboostsrl/test', exist_ok=True)
+        os.makedirs(os.path.join(self.workspace, 'test'), exist_ok=True)
         # Write test_bk
-        write_to_file(['import: "../background.txt".'], 'tboostsrl/test/test_bk.txt')
-
-        write_to_file(test_pos, 'tboostsrl/test/test_pos.txt')
-        write_to_file(test_neg, 'tboostsrl/test/test_neg.txt')
-        write_to_file(test_facts, 'tboostsrl/test/test_facts.txt')
-
-        self.target = model.target
-
-        CALL = '(cd tboostsrl; java -jar v1-0.jar -i -model train/models/ -test test/ -target ' + \
-               ','.join(self.target) + ' -trees ' + str(trees) + ' -aucJarPath . > test_output.txt 2>&1)'
-        call_process(CALL)
+        write_to_file(['import: "../background.txt".'], os.path.join(self.workspace, 'test/test_bk.txt'))
+
+        write_examples(test_pos, os.path.join(self.workspace, 'test/test_pos.txt'))
+        write_examples(test_neg, os.path.join(self.workspace, 'test/test_neg.txt'))
+        if getattr(model, 'relevant', None):
+            test_facts = relevant_facts(model.relevant[0], list(test_pos) + list(test_neg), list(test_facts), depth=model.relevant[1])
+        write_examples(test_facts, os.path.join(self.workspace, 'test/test_facts.txt'))
+
+        jvm = getattr(model, 'jvm', {})
+        java = java_command(len(test_facts), len(test_pos) + len(test_neg), heap=jvm.get('heap'), profile=jvm.get('profile'))
+        CALL = '(cd ' + self.workspace + '; ' + java + ' -i -model train/models/ -test test/ -target ' + \
+               ','.join(self.target) + ' -trees ' + str(trees) + ' -aucJarPath ' + __location__ + ' > test_output.txt 2>&1)'
+        self.usage = call_process(CALL, timeout=jvm.get('timeout'))
+
+        if self.cache_path:
+            self.save_cache()
+
+    def save_cache(self):
+        '''Writes predictions of every target and the test output to the cache.'''
+        arrays = {}
+        for target in self.target:
+            ids, probabilities, labels = self.predictions(target)
+            arrays['ids_' + target] = ids
+            arrays['probabilities_' + target] = probabilities
+            arrays['labels_' + target] = labels
+        with open(os.path.join(self.workspace, 'test_output.txt'), 'r') as f:
+            arrays['output'] = np.array(f.read())
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        # written aside and renamed so a concurrent reader never sees a partial file
+        temporary = self.cache_path[:-len('.npz')] + '.' + str(os.getpid()) + '.npz'
+        np.savez_compressed(temporary, **arrays)
+        os.replace(temporary, self.cache_path)
+
+    def load_cache(self):
+        '''Reads predictions from the cache and restores the test output and the
+           test folder with the results of every target, as inference leaves them.'''
+        with np.load(self.cache_path) as cached:
+            for target in self.target:
+                self.predictions_arrays[target] = (cached['ids_' + target], cached['probabilities_' + target], cached['labels_' + target])
+            output = str(cached['output'])
+        os.makedirs(os.path.join(self.workspace, 'test'), exist_ok=True)
+        with open(os.path.join(self.workspace, 'test_output.txt'), 'w') as f:
+            f.write(output)
+        for target in self.target:
+            ids, probabilities, labels = self.predictions_arrays[target]
+            write_to_file([ids[i] + ' ' + repr(float(probabilities[i])) for i in range(len(ids))], os.path.join(self.workspace, 'test/results_' + target + '.db'))
+
+    def predictions(self, target=None):
+        '''Returns the predictions of target as arrays of example ids,
+           probabilities and labels (1 for positive examples).'''
+        target = target if target else self.target[0]
+        if target not in self.predictions_arrays:
+            results_file = os.path.join(self.workspace, 'test/results_' + target + '.db')
+            with open(results_file, 'r') as f:
+                lines = [line.rsplit(None, 1) for line in f.read().splitlines() if line.strip()]
+            positives = set(example_key(example) for example in self.test_pos)
+            ids = np.array([line[0] for line in lines], dtype=str)
+            probabilities = np.array([float(line[1]) for line in lines], dtype=np.float64)
+            labels = np.array([example_key(line[0]) in positives for line in lines], dtype=np.int8)
+            self.predictions_arrays[target] = (ids, probabilities, labels)
+        return self.predictions_arrays[target]
 
     def summarize_results(self):
-        with open('tboostsrl/test_output.txt', 'r') as f:
+        with open(os.path.join(self.workspace, 'test_output.txt'), 'r') as f:
             text = f.read()
         line = re.findall(r'%   AUC ROC.*|%   AUC PR.*|%   CLL.*|%   Precision.*|%   Recall.*|%   F1.*', text)
         line = [word.replace(' ','').replace('\t','').replace('%','').replace('atthreshold=',';') for word in line]
@@ -411,6 +796,18 @@ class test(object):
         }
         return results
 
+    def probabilities(self, target=None):
+        '''Returns labels and probabilities of being true of the predictions of target.
+           Negative examples are written by BoostSRL as !example with the probability of being false.'''
+        ids, probabilities, labels = self.predictions(target)
+        negated = np.char.startswith(ids, '!')
+        return (labels, np.where(negated, 1 - probabilities, probabilities))
+
+    def metrics(self, target=None, threshold=0.5):
+        '''Computes the metrics of summarize_results from the predictions, with no text scraping.'''
+        labels, probabilities = self.probabilities(target)
+        return metrics.summarize(labels, probabilities, threshold=threshold)
+
     def float_split(self, line):
         '''Returns a list where the first item is a string and the second is a float.
            Used when returning inference results.
@@ -423,20 +820,12 @@ class test(object):
 
     def inference_results(self, target):
         '''Converts BoostSRL results into a Python dictionary.'''
-        results_file = 'tboostsrl/test/results_' + target + '.db'
-        inference_dict = {}
-
-        with open(results_file, 'r') as f:
-            for line in f.read().splitlines():
-                full = self.float_split(line)
-                key_predicate = full[0]
-                value_regression = full[1]
-                inference_dict[key_predicate] = value_regression
-        return inference_dict
+        ids, probabilities, labels = self.predictions(target)
+        return dict(zip(ids.tolist(), probabilities.tolist()))
 
     def get_testing_time(self):
         '''Return the testing time as a float representing the total number of seconds seconds.'''
-        with open('tboostsrl/test_output.txt', 'r') as f:
+        with open(os.path.join(self.workspace, 'test_output.txt'), 'r') as f:
             text = f.read()
         line = re.findall(r'% Total inference time \(\d* trees\):.*', text)
         # Remove the last character "." from the line and split it on spaces.
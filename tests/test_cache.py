@@ -0,0 +1,55 @@
+import os
+
+from tboostsrl import tboostsrl
+from revision import revision
+
+OUTPUT = '''%   AUC ROC   = 0.750000
+%   AUC PR    = 0.833333
+%   CLL	      = -0.500000
+%   Precision = 0.500000 at threshold = 0.500
+%   Recall    = 1.000000
+%   F1        = 0.666667
+% Total inference time (1 trees): 0.010 seconds.
+'''
+
+class model(object):
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.target = ['advisedby']
+
+def run_inference(calls):
+    '''Fake BoostSRL inference writing the output and results files'''
+    def call_process(call, timeout=None):
+        workspace = call[len('(cd '):call.index(';')]
+        calls.append(call)
+        with open(os.path.join(workspace, 'test_output.txt'), 'w') as f:
+            f.write(OUTPUT)
+        with open(os.path.join(workspace, 'test/results_advisedby.db'), 'w') as f:
+            f.write('advisedby(a, b). 0.8\n!advisedby(c, d). 0.6\n')
+        return {}
+    return call_process
+
+def test_repeated_run_uses_cache_and_keeps_test_folder(tmp_path, monkeypatch):
+    workspace = str(tmp_path / 'ws')
+    cache = str(tmp_path / 'cache')
+    os.makedirs(os.path.join(workspace, 'train/models'))
+    with open(os.path.join(workspace, 'train/models/model.txt'), 'w') as f:
+        f.write('model')
+    with open(os.path.join(workspace, 'train_output.txt'), 'w') as f:
+        f.write('')
+    calls = []
+    monkeypatch.setattr(tboostsrl, 'call_process', run_inference(calls))
+    pos, neg, facts = ['advisedby(a, b).'], ['advisedby(c, d).'], ['professor(b).']
+
+    first = tboostsrl.test(model(workspace), pos, neg, facts, cache=cache)
+    revision.delete_test_files(workspace)
+    second = tboostsrl.test(model(workspace), pos, neg, facts, cache=cache)
+
+    assert len(calls) == 1
+    assert second.summarize_results() == first.summarize_results()
+    assert second.inference_results('advisedby') == first.inference_results('advisedby')
+    with open(os.path.join(workspace, 'test/results_advisedby.db'), 'r') as f:
+        assert f.read().split() == ['advisedby(a,', 'b).', '0.8', '!advisedby(c,', 'd).', '0.6']
+    # the best model is kept with its test folder, as theory_revision does
+    revision.save_model_files(workspace)
+    assert os.path.isfile(os.path.join(workspace, 'best/test/results_advisedby.db'))
@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+from tboostsrl import tboostsrl
+
+linux = pytest.mark.skipif(not os.path.isdir('/proc'), reason='peak memory is sampled from /proc')
+
+@linux
+def test_peak_rss_excludes_memory_of_the_parent():
+    parent = b'1' * (300 * 1024 * 1024)
+    usage = tboostsrl.call_process('sleep 0.3')
+    assert usage['Exit code'] == 0
+    assert usage['Peak RSS'] < 100
+    del parent
+
+@linux
+def test_peak_rss_measures_the_child():
+    usage = tboostsrl.call_process(sys.executable + ' -c "import time; x = bytearray(200 * 1024 * 1024); x[::4096] = b\'1\' * len(x[::4096]); time.sleep(0.5)"')
+    assert usage['Peak RSS'] > 200
+
+def test_non_zero_exit_code_raises():
+    with pytest.raises(Exception, match='exited with code 3'):
+        tboostsrl.call_process('exit 3')
+
+def test_timeout_kills_the_process():
+    with pytest.raises(Exception, match='timed out'):
+        tboostsrl.call_process('sleep 10', timeout=0.2)
@@ -0,0 +1,43 @@
+from curve import curve
+
+def test_jobs_are_independent_without_warm_start():
+    assert curve.get_jobs(['transfer', 'rdn'], [0.2, 0.4]) == [('transfer', [0.2]), ('transfer', [0.4]), ('rdn', [0.2]), ('rdn', [0.4])]
+
+def test_warm_start_chains_the_amounts_of_a_method():
+    assert curve.get_jobs(['transfer', 'rdn'], [0.2, 0.4], warm_start=True) == [('transfer', [0.2, 0.4]), ('rdn', [0.2, 0.4])]
+
+def test_fractions_are_nested_prefixes():
+    fractions = curve.get_fractions(list(range(10)), [0.2, 0.5, 1.0])
+    assert fractions == [[0, 1], [0, 1, 2, 3, 4], list(range(10))]
+
+def fake_run_job(job):
+    return dict((job['method'] + '_' + str(amount), {'CLL': -amount}) for amount in job['amounts'])
+
+def test_completed_jobs_are_not_run_again(monkeypatch, tmp_path):
+    run = []
+    def run_job(job):
+        run.append((job['method'], job['amounts']))
+        return fake_run_job(job)
+    monkeypatch.setattr(curve, 'run_job', run_job)
+    checkpoints = {}
+    completed = {'rdn_0.5': {'CLL': 'journal'}}
+    results = curve.learning_curve(['professor(+person).'], 'advisedby', list(range(10)), list(range(10)), ['professor(a).'], [], [], ['professor(b).'], None, methods={'rdn': {}, 'rdn_b': {}}, amounts=[0.5, 1.0], workspace=str(tmp_path / 'curve'), completed=completed, checkpoint=checkpoints.__setitem__)
+    assert ('rdn', [0.5]) not in run
+    assert results['rdn_0.5'] == {'CLL': 'journal'}
+    assert sorted(checkpoints) == ['rdn_1.0', 'rdn_b_0.5', 'rdn_b_1.0']
+
+marker = 'imported'
+
+def read_marker(i):
+    return marker
+
+def test_pool_forks_workers():
+    # spawned workers would import this module again and read 'imported'
+    global marker
+    marker = 'forked'
+    pool = curve.get_pool(1)
+    try:
+        assert pool.map(read_marker, [0]) == ['forked']
+    finally:
+        pool.close()
+        pool.join()
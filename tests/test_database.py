@@ -0,0 +1,28 @@
+from database import sqlite_store
+
+def test_clause_of_missing_predicate_is_false_and_creates_nothing():
+    store = sqlite_store(facts=['publication(p1, a).'])
+    tables = dict(store.tables)
+    bound = {'H0': 'examples.a0'}
+    assert store.clause_sql([('professor', ('H0',))], bound) == ('0', [])
+    assert store.clause_sql([('publication', ('P', 'H0')), ('professor', ('H0',))], bound) == ('0', [])
+    store.remove('professor(a).')
+    assert store.tables == tables
+    assert store.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'p\\_professor%' ESCAPE '\\'").fetchone()[0] == 0
+
+def test_clause_of_loaded_predicate_joins_its_table():
+    store = sqlite_store(facts=['publication(p1, a).'])
+    sql, params = store.clause_sql([('publication', ('P', 'H0'))], {'H0': 'examples.a0'})
+    assert sql == 'EXISTS (SELECT 1 FROM p_publication_2 t0 WHERE t0.a1 = examples.a0)'
+    assert params == []
+
+def test_clear_keeps_tables_for_a_reload(tmp_path):
+    path = str(tmp_path / 'facts.db')
+    store = sqlite_store(path, facts=['publication(p1, a).', 'professor(a).'])
+    store.connection.close()
+    reopened = sqlite_store(path)
+    assert len(reopened) == 2
+    reopened.clear()
+    assert len(reopened) == 0 and len(reopened.tables) == 2
+    reopened.load(['professor(a).'])
+    assert len(reopened) == 1
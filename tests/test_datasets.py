@@ -0,0 +1,36 @@
+import random
+
+from datasets.get_datasets import fold_view, datasets
+
+folds = [['a', 'b'], ['c', 'd', 'e'], ['f']]
+
+def test_kfold_views_read_the_folds():
+    train, test = datasets.get_kfold(1, folds)
+    assert list(train) == ['a', 'b', 'f']
+    assert list(test) == ['c', 'd', 'e']
+    assert len(train) == 3 and train[2] == 'f'
+    assert list(train[1:]) == ['b', 'f']
+
+def test_view_is_a_sequence():
+    view = fold_view(folds, [0, 1, 2])
+    assert 'd' in view and view.index('d') == 3
+    assert sorted(random.Random(0).sample(view, 6)) == ['a', 'b', 'c', 'd', 'e', 'f']
+
+def test_shuffle_is_reproducible():
+    first = fold_view(folds, [0, 1, 2])
+    second = fold_view(folds, [0, 1, 2])
+    first.shuffle(random.Random('441773_0'))
+    second.shuffle(random.Random('441773_0'))
+    assert list(first) == list(second)
+    assert sorted(first) == ['a', 'b', 'c', 'd', 'e', 'f']
+    random.seed(1)
+    first.shuffle()
+    random.seed(1)
+    second.shuffle()
+    assert list(first) == list(second)
+
+def test_shuffle_does_not_copy_or_change_the_folds():
+    view = fold_view(folds, [0, 1])
+    view.shuffle(seed=3)
+    assert folds == [['a', 'b'], ['c', 'd', 'e'], ['f']]
+    assert view.folds is folds
@@ -0,0 +1,60 @@
+from evaluation import evaluation
+from datasets.get_datasets import fold_view
+
+source = [['workedunder(A,B)', {'': 'movie(C,A),movie(C,B)'}, {'true': [0.1, 0, 2], 'false': [0.1, 2, 0]}]]
+facts = [['publication(t1,ann).', 'publication(t1,bob).'], ['publication(t2,carl).', 'publication(t3,dan).']]
+pos = ['advisedby(ann,bob).']
+neg = ['advisedby(carl,dan).']
+mappings = [
+    ['workedunder(A,B) -> advisedby(A,B)', 'movie(A,B) -> publication(A,B)'],
+    ['workedunder(A,B) -> advisedby(A,B)'],
+    ]
+
+def test_select_mappings_accepts_fold_view():
+    selected = evaluation.select_mappings(source, mappings, pos, neg, fold_view(facts, [0, 1]), n_select=2)
+    assert selected == evaluation.select_mappings(source, mappings, pos, neg, facts[0] + facts[1], n_select=2)
+    assert selected[0][0] == mappings[0]
+    assert selected[0][2] > selected[1][2]
+
+from evaluation import fact_store
+from database import sqlite_store
+
+class counting_store(fact_store):
+    '''fact_store counting the conjunctions tested, not its own recursive calls'''
+    def __init__(self, facts):
+        fact_store.__init__(self, facts)
+        self.calls = []
+        self.depth = 0
+
+    def satisfiable(self, literals, binding):
+        if not self.depth:
+            self.calls.append((literals, tuple(sorted(binding.items()))))
+        self.depth += 1
+        try:
+            return fact_store.satisfiable(self, literals, binding)
+        finally:
+            self.depth -= 1
+
+forest = [
+    ['advisedby(A,B)', {'': 'publication(C,A),publication(C,B)', 'true': 'professor(B)'}, {}],
+    ['advisedby(X,Y)', {'': 'publication(D,Y),publication(D,X)', 'false': 'student(X)'}, {}],
+    ]
+target_facts = ['publication(t1,ann).', 'publication(t1,bob).', 'professor(bob).', 'student(carl).']
+examples = ['advisedby(ann,bob).', 'advisedby(carl,dan).']
+
+def test_canonical_form_ignores_renaming_and_order():
+    first = evaluation.canonical([('publication', ('C', 'A')), ('publication', ('C', 'B'))], ('A', 'B'))
+    second = evaluation.canonical([('publication', ('D', 'Y')), ('publication', ('D', 'X'))], ('X', 'Y'))
+    assert first == second == (('publication', ('V0', 'H0')), ('publication', ('V0', 'H1')))
+    assert evaluation.canonical([('publication', ('C', 'B'))], ('A', 'B')) != evaluation.canonical([('publication', ('C', 'A'))], ('A', 'B'))
+
+def test_conjunctions_are_tested_once_per_example_across_trees():
+    store = counting_store(target_facts)
+    leaves = evaluation.get_leaves(forest, store, examples)
+    assert leaves == [['true,true', 'false'], ['true', 'false,true']]
+    assert len(store.calls) == len(set(store.calls))
+    # root of both trees, professor(B) for ann, student(X) for carl
+    assert len(store.calls) == 4
+
+def test_sqlite_store_reaches_the_same_leaves():
+    assert evaluation.get_leaves(forest, sqlite_store(facts=target_facts), examples) == evaluation.get_leaves(forest, fact_store(target_facts), examples)
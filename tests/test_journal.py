@@ -0,0 +1,46 @@
+import json
+
+from journal import journal
+
+def write_journal(path, records, tail=b''):
+    with open(path, 'wb') as f:
+        for record in records:
+            f.write(json.dumps(record).encode('utf-8') + b'\n')
+        f.write(tail)
+
+def test_torn_last_line_is_removed(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    write_journal(path, [{'nbr': 1, 'fold': 0, 'method': 'rdn_0.2', 'result': 1}], tail=b'{"nbr": 1, "fo')
+    j = journal(path)
+    assert len(j.records) == 1 and j.corrupt == []
+    j.checkpoint(1, 0, 'rdn_0.4', 2)
+    j.close()
+    assert [record['method'] for record in journal(path).records] == ['rdn_0.2', 'rdn_0.4']
+
+def test_corrupt_middle_line_keeps_later_records(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    write_journal(path, [{'nbr': 1, 'fold': 0, 'method': 'rdn_0.2', 'result': 1}])
+    with open(path, 'ab') as f:
+        f.write(b'\xff not json\n')
+        f.write(json.dumps({'nbr': 1, 'fold': 0, 'method': 'rdn_0.4', 'result': 2}).encode('utf-8') + b'\n')
+    size = len(open(path, 'rb').read())
+    j = journal(path)
+    assert j.corrupt == [2]
+    assert j.get(1, 0, 'rdn_0.4') == 2
+    j.close()
+    assert len(open(path, 'rb').read()) == size
+
+def test_resume_returns_finished_jobs(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    j = journal(path)
+    j.checkpoint(1, None, 'source', ['tree'])
+    j.checkpoint(1, 0, 'transfer_0.2', {'CLL': -0.5})
+    j.checkpoint(1, 1, 'transfer_0.2', {'CLL': -0.6})
+    j.checkpoint(1, None, 'experiment', [{'fold': 0}])
+    j.close()
+    resumed = journal(path)
+    assert resumed.get(1, None, 'source') == ['tree']
+    assert resumed.get_fold(1, 0) == {'transfer_0.2': {'CLL': -0.5}}
+    assert resumed.get(1, 2, 'transfer_0.2') is None
+    assert resumed.experiments() == [[{'fold': 0}]]
+    resumed.close()
@@ -0,0 +1,53 @@
+import os
+import time
+import pickle
+import threading
+
+import logger as log
+
+def test_quiet_logger_is_flushed_by_timer(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    l = log.logger(path, echo=False, flush_interval=0.05)
+    l('only message')
+    time.sleep(0.3)
+    with open(path) as f:
+        assert f.read() == 'only message\n'
+    l.close()
+
+def test_unpickled_copies_share_one_file(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    data = pickle.dumps(log.logger(path, echo=False, flush_interval=60))
+    first = pickle.loads(data)
+    second = pickle.loads(data)
+    assert first.fd == second.fd
+    first('a')
+    second('b')
+    first.flush()
+    with open(path) as f:
+        assert f.read() == 'a\nb\n'
+    first.close()
+
+def test_close_stops_the_flusher(tmp_path):
+    before = threading.active_count()
+    loggers = [log.logger(str(tmp_path / ('log' + str(i) + '.txt')), echo=False, flush_interval=0.05) for i in range(5)]
+    assert threading.active_count() == before + 5
+    for l in loggers:
+        l('message')
+        l.close()
+        assert l.flusher is None
+    assert threading.active_count() == before
+    with open(str(tmp_path / 'log0.txt')) as f:
+        assert f.read() == 'message\n'
+
+def test_reopening_keeps_a_single_flusher(tmp_path):
+    before = threading.active_count()
+    l = log.logger(str(tmp_path / 'a.txt'), echo=False, flush_interval=0.05)
+    l.open(str(tmp_path / 'b.txt'))
+    l.reset()
+    assert threading.active_count() == before + 1
+    l('quiet')
+    time.sleep(0.3)
+    with open(str(tmp_path / 'b.txt')) as f:
+        assert f.read() == 'quiet\n'
+    l.close()
+    assert threading.active_count() == before
@@ -0,0 +1,31 @@
+import pytest
+
+from tboostsrl.metrics import metrics
+
+def test_auc_pr_false_positive_only_threshold():
+    # (recall, precision): (0, 1) (.5, 1) (.5, .5) (1, 2/3)
+    assert metrics.auc_pr([1, 0, 1], [.9, .8, .7]) == pytest.approx(0.5 + 0.5 * (0.5 + 2 / 3) / 2)
+
+def test_auc_pr_consecutive_false_positives():
+    # (recall, precision): (0, 1) (.5, 1) (.5, .5) (.5, 1/3) (.5, 1/4) (1, 2/5)
+    assert metrics.auc_pr([1, 0, 0, 0, 1], [.9, .8, .7, .6, .5]) == pytest.approx(0.6625)
+
+def test_auc_pr_interpolates_ties():
+    # a tie of 1 positive and 1 negative after a positive:
+    # (recall, precision): (0, 1) (.5, 1) (1, 2/3) interpolated by Davis and Goadrich
+    assert metrics.auc_pr([1, 1, 0], [.9, .5, .5]) == pytest.approx(0.5 + 0.5 * (1 + 2 / 3) / 2)
+
+def test_auc_pr_perfect_ranking():
+    assert metrics.auc_pr([1, 1, 0, 0], [.9, .8, .2, .1]) == pytest.approx(1.0)
+
+def test_auc_roc_ties_count_half():
+    # pairs (positive, negative): (.9, .9) half, (.9, .1) and (.5, .1) ranked, (.5, .9) not
+    assert metrics.auc_roc([1, 0, 1, 0], [.9, .9, .5, .1]) == pytest.approx(2.5 / 4)
+
+def test_bootstrap_drops_single_class_resamples():
+    labels = [1, 0, 1, 0]
+    probabilities = [.9, .1, .8, .2]
+    lower, upper, dropped = metrics.bootstrap(labels, probabilities, metrics.auc_roc, n_samples=200, seed=0)
+    # every resample with both classes is perfectly ranked
+    assert (lower, upper) == (1.0, 1.0)
+    assert 0 < dropped < 200
@@ -0,0 +1,24 @@
+from tboostsrl.tboostsrl import relevant_facts
+
+background = ['publication(-title,+person).', 'publication(+title,-person).', 'professor(+person).']
+examples = ['advisedby(bob, ann).']
+facts = ['publication(t1, bob).', 'publication(t1, tom).', 'professor(ann).', 'professor(tom).', 'professor(eve).']
+
+def test_depth_limits_the_chain_of_literals():
+    assert relevant_facts(background, examples, facts, depth=1) == ['publication(t1, bob).', 'professor(ann).']
+    assert relevant_facts(background, examples, facts, depth=2) == ['publication(t1, bob).', 'publication(t1, tom).', 'professor(ann).']
+    assert relevant_facts(background, examples, facts, depth=3) == facts[:4]
+    assert relevant_facts(background, examples, facts) == facts[:4]
+
+def test_output_arguments_are_not_inputs():
+    # title is only an output, so t1 does not reach publication(t1, tom).
+    only_output = ['publication(-title,+person).', 'professor(+person).']
+    assert relevant_facts(only_output, examples, facts) == ['publication(t1, bob).', 'professor(ann).']
+
+def test_constant_arguments_are_not_followed():
+    constants = ['publication(#title,+person).', 'professor(+person).']
+    assert relevant_facts(constants, ['advisedby(bob, ann).'], ['publication(t1, bob).', 'publication(t1, tom).']) == ['publication(t1, bob).']
+
+def test_facts_without_a_mode_of_their_arity_are_kept():
+    kept = ['student(zoe).', 'professor(tom, 2).', 'publication(t9, zoe).']
+    assert relevant_facts(background, examples, kept) == ['student(zoe).', 'professor(tom, 2).']
@@ -0,0 +1,34 @@
+import os
+import sys
+import hashlib
+import importlib.util
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rembedding'))
+import rembedding
+
+# rembedding/transfer.py shares its name with transfer.py of the root
+spec = importlib.util.spec_from_file_location('rembedding_transfer', os.path.join(os.path.dirname(rembedding.__file__), 'transfer.py'))
+rtransfer = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rtransfer)
+
+source_settings = {'workedunder': ['person', 'person'], 'actor': ['person']}
+source_data = [('workedunder', ['a', 'b']), ('workedunder', ['c', 'b']), ('actor', ['a']), ('actor', ['c'])]
+target_settings = {'advisedby': ['person', 'person'], 'student': ['person']}
+target_data = [('advisedby', ['x', 'y']), ('advisedby', ['z', 'y']), ('student', ['x']), ('student', ['z'])]
+
+def fake_run_embedding(self, corpus=None, **kwargs):
+    '''Vectors drawn from each word instead of training Word2Vec'''
+    words = sorted(set(token for sentence in corpus for token in sentence))
+    vectors = np.array([np.random.default_rng(int(hashlib.sha1(word.encode('utf-8')).hexdigest()[:8], 16)).random(8) for word in words])
+    self.load_vectors(words, vectors)
+
+def test_perform_transfer_runs_when_imported(monkeypatch, capsys):
+    monkeypatch.setattr(rembedding.REmbedding, 'run_embedding', fake_run_embedding)
+    mapping = rtransfer.PerformTransfer(source_data, source_settings, target_data, target_settings, n_runs=1, max_depth=3, n_sentences=50, seed=0, processes=1)
+    assert mapping['types'] == {'person': 'person'}
+    assert set(mapping['predicates']) <= {'workedunder', 'actor', '_workedunder'}
+    for source, target in mapping['predicates'].items():
+        assert len(source_settings[source.lstrip('_')]) == len(target_settings[target.lstrip('_')])
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,24 @@
+from revision import revision
+from datasets.get_datasets import fold_view
+
+structured = [['advisedby(A,B)', {'': 'publication(C,A),publication(C,B)'}, {'true': [0.1, 0, 2], 'false': [0.1, 2, 0]}]]
+facts = [['publication(t1,ann).', 'publication(t1,bob).'], ['publication(t2,carl).', 'publication(t3,dan).']]
+pos = ['advisedby(ann,bob).']
+neg = ['advisedby(carl,dan).']
+
+def test_coverage_candidate_accepts_fold_view():
+    view_candidate, view_points = revision.get_coverage_candidate(structured, fold_view(facts, [0, 1]), pos, neg)
+    list_candidate, list_points = revision.get_coverage_candidate(structured, facts[0] + facts[1], pos, neg)
+    assert view_candidate == list_candidate
+    assert view_points == list_points
+
+def test_validation_fraction_is_held_out_reproducibly():
+    train_pos, train_neg, held_out = revision.get_validation(list('abcdefghij'), list('klmnopqrst'), 0.2, seed=3)
+    assert len(train_pos) == 8 and len(held_out[0]) == 2
+    assert sorted(train_pos + held_out[0]) == list('abcdefghij')
+    assert (train_pos, train_neg, held_out) == revision.get_validation(list('abcdefghij'), list('klmnopqrst'), 0.2, seed=3)
+
+def test_held_out_examples_are_not_split_again():
+    held_out = (['a'], ['k'])
+    assert revision.get_validation(['b'], ['l'], held_out) == (['b'], ['l'], held_out)
+    assert revision.get_validation(['b'], ['l'], None) == (['b'], ['l'], None)
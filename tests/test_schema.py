@@ -0,0 +1,29 @@
+from tboostsrl.schema import schema, get_schema
+
+background = ['publication(-title,+person).', 'publication(+title,-person).', 'professor(+person).', 'taughtby(#course, `person).', 'bad mode']
+
+def test_modes_are_parsed_into_ids_types_and_flags():
+    s = schema(background)
+    assert s.ids == {'publication': 0, 'professor': 1, 'taughtby': 2}
+    assert s.types['publication'] == ['title', 'person']
+    assert s.flags['publication'] == [['-', '+'], ['+', '-']]
+    assert s.flags['taughtby'] == [['#', '`']]
+    assert s.arity('taughtby') == 2 and s.arity('student') == 0
+    assert 'professor' in s and 'student' not in s and len(s) == 3
+    assert s.all_types() == {'title', 'person', 'course'}
+
+def test_declarations_drop_flags_once_per_predicate():
+    s = schema(background)
+    assert s.declarations == ['publication(title,person).', 'professor(person).', 'taughtby(course,person).']
+    assert s.declaration('professor') == 'professor(person).'
+    assert s.declaration('student') is None
+    assert s.transfer_declarations[:2] == ['publication(title,person).', 'professor(person).']
+
+def test_invalid_modes_are_reported():
+    assert schema(background).invalid == ['bad mode']
+
+def test_schema_is_compiled_once_per_background():
+    first = get_schema(background)
+    assert get_schema(list(background)) is first
+    assert get_schema(first) is first
+    assert get_schema(background[:2]) is not first
@@ -0,0 +1,59 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+from server import scoring_server, scoring_http_server, scoring_handler
+
+class constant_model(object):
+    trees = []
+
+    def score(self, store, examples):
+        return [0.5 for example in examples]
+
+def post(port, path, body):
+    request = urllib.request.Request('http://127.0.0.1:' + str(port) + path, data=json.dumps(body).encode('utf-8'))
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return (response.status, json.loads(response.read()))
+    except urllib.error.HTTPError as e:
+        return (e.code, json.loads(e.read()))
+
+def queue(scoring, examples):
+    request = {'model': 'advisedby', 'examples': examples, 'done': threading.Event(), 'result': None, 'error': None}
+    scoring.queue.put(request)
+    assert request['done'].wait(5)
+    return request
+
+def test_batcher_survives_malformed_requests():
+    scoring = scoring_server({'advisedby': constant_model()}, max_wait=0.05)
+    assert queue(scoring, 3)['error'] is not None
+    assert queue(scoring, [['a']])['error'] is not None
+    assert queue(scoring, ['advisedby(a, b).'])['result'] == [0.5]
+
+def test_malformed_atom_fails_only_its_request():
+    scoring = scoring_server({'advisedby': constant_model()})
+    good = {'model': 'advisedby', 'examples': ['advisedby(a, b).'], 'done': threading.Event(), 'result': None, 'error': None}
+    bad = {'model': 'advisedby', 'examples': ['not an atom'], 'done': threading.Event(), 'result': None, 'error': None}
+    scoring.score_batch([good, bad])
+    assert good['result'] == [0.5] and good['error'] is None
+    assert bad['error'] is not None
+
+def test_invalid_requests_get_400():
+    scoring = scoring_server({'advisedby': constant_model()})
+    httpd = scoring_http_server(('127.0.0.1', 0), scoring_handler)
+    httpd.scoring = scoring
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    try:
+        assert post(port, '/score', {'examples': 3})[0] == 400
+        assert post(port, '/score', {'examples': [['a']]})[0] == 400
+        assert post(port, '/score', {'examples': ['advisedby(a, b']})[0] == 400
+        assert post(port, '/score', [1, 2])[0] == 400
+        assert post(port, '/facts', ['professor(a).'])[0] == 400
+        assert post(port, '/facts', {'add': 'professor(a).'})[0] == 400
+        assert post(port, '/score', {'examples': ['advisedby(a, b).']}) == (200, {'probabilities': [0.5]})
+        assert post(port, '/facts', {'add': ['professor(a).']}) == (200, {'facts': 1})
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,24 @@
+from sweep import sweep
+
+folds = [{'train_pos': ['advisedby(a, b).'], 'train_neg': ['advisedby(b, a).'], 'train_facts': ['professor(b).'],
+          'test_pos': ['advisedby(c, d).'], 'test_neg': ['advisedby(d, c).'], 'test_facts': ['professor(d).']} for i in range(4)]
+space = {'trees': [1, 2, 3, 4], 'maxTreeDepth': [2]}
+
+def fake_run_job(job):
+    '''CLL rising with the number of trees, lower on later folds'''
+    return (job['id'], job['fold'], {'CLL': -1.0 / job['config']['trees'] - job['fold']})
+
+def test_halving_runs_the_survivor_on_every_fold(monkeypatch, tmp_path):
+    monkeypatch.setattr(sweep, 'run_job', fake_run_job)
+    results = sweep.search(['professor(+person).'], 'advisedby', folds, space, strategy='halving', n_samples=4, eta=2, seed=0, workspace=str(tmp_path / 'sweep'))
+    assert results[0]['config']['trees'] == 4
+    assert results[0]['Folds'] == len(folds)
+    assert results[0]['CLL'] == -0.25 - 1.5
+    # 4 configurations on the first fold, 2 on the second, 1 on the others
+    assert [result['Folds'] for result in results] == [4, 2, 1, 1]
+
+def test_grid_runs_every_configuration_on_every_fold(monkeypatch, tmp_path):
+    monkeypatch.setattr(sweep, 'run_job', fake_run_job)
+    results = sweep.search(['professor(+person).'], 'advisedby', folds, space, workspace=str(tmp_path / 'sweep'))
+    assert [result['config']['trees'] for result in results] == [4, 3, 2, 1]
+    assert all(result['Folds'] == len(folds) for result in results)
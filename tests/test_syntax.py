@@ -0,0 +1,32 @@
+import pytest
+
+from tboostsrl import tboostsrl
+from datasets.get_datasets import fold_view
+
+def test_valid_examples_mark_the_view():
+    view = fold_view([['advisedby(ann, bob).', 'professor(bob).'], ['student(ann).']], [0, 1])
+    tboostsrl.inspect_examples_syntax(view)
+    assert view.validated
+
+def test_validated_views_are_not_checked_again():
+    view = fold_view([['not an example']], [0])
+    view.validated = True
+    tboostsrl.inspect_examples_syntax(view)
+
+def test_bad_line_is_rejected():
+    with pytest.raises(Exception, match='incorrect syntax: professor bob'):
+        tboostsrl.inspect_examples_syntax(['advisedby(ann, bob).', 'professor bob', 'student(ann).'])
+    view = fold_view([['advisedby(ann, bob).', 'professor(+bob).']], [0])
+    with pytest.raises(Exception, match=r'professor\(\+bob\)'):
+        tboostsrl.inspect_examples_syntax(view)
+    assert not view.validated
+
+def test_lines_containing_an_example_are_accepted():
+    # exam_re searches lines, so text around an example is allowed
+    tboostsrl.inspect_text_syntax('advisedby(ann, bob). \nprofessor(bob).')
+
+def test_facts_file_is_checked_once(tmp_path):
+    facts = tboostsrl.facts_file(['professor(bob).', 'student(ann).'], str(tmp_path / 'facts.txt'))
+    assert facts.validated
+    with pytest.raises(Exception, match='incorrect syntax'):
+        tboostsrl.facts_file(['professor(bob).', ''], str(tmp_path / 'bad.txt'))
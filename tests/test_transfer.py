@@ -0,0 +1,46 @@
+from transfer import transfer, compiled_mapping, literal_re
+
+mapping = ['workedunder(A,B) -> advisedby(B,A)', 'movie(A,B) -> publication(A,B)', 'actor(A) -> student(A)']
+structured = [
+    ['workedunder(A,B)', {'': 'movie(C,A), movie(C,B)', 'true': 'actor(A)', 'false': 'director(A)', 'false,true': 'actor(B)'},
+     {'true,true': [0.1, 0, 3], 'true,false': [0.2, 1, 2], 'false,true,true': [0.3, 2, 1], 'false,true,false': [0.4, 1, 1], 'false,false': [0.5, 4, 0]}],
+    ['workedunder(A,B)', {'': 'movie(C,A), movie(C,B)'}, {'true': [0.1, 0, 3], 'false': [0.5, 4, 0]}],
+    ]
+
+def old_transfer(structured, mapping):
+    '''Transfer with the mapping structure used before compiled_mapping'''
+    mapping_struct = transfer.get_mapping_struct(mapping)
+    ret = []
+    for struct in structured:
+        head = transfer.transfer_literal(literal_re.findall(struct[0])[0], mapping_struct)
+        tree = transfer.transfer_tree(transfer.get_transfer_tree(struct[1], struct[2]), mapping_struct)
+        ret.append(transfer.get_structured_from_transfer_tree(transfer.literal_to_str(head), tree))
+    return ret
+
+def test_compiled_mapping_matches_the_old_transfer():
+    assert transfer.transfer(structured, mapping) == old_transfer(structured, mapping)
+
+def test_arguments_are_permuted_and_unmapped_nodes_merged():
+    transferred = transfer.transfer(structured, mapping)
+    assert transferred[0][0] == 'advisedby(B, A)'
+    assert transferred[0][1] == {'': 'publication(C, A), publication(C, B)', 'true': 'student(A)', 'false': 'student(B)'}
+    assert transferred[0][2]['false,true'] == [0.3, 2, 1]
+
+def test_compiled_literals_match_the_mapping_structure():
+    compiled = compiled_mapping(mapping)
+    mapping_struct = transfer.get_mapping_struct(mapping)
+    for literal in [('workedunder', 'X, Y'), ('movie', 'M, X'), ('actor', 'Z'), ('director', 'Z')]:
+        expected = transfer.transfer_literal(literal, mapping_struct)
+        assert compiled.literal((literal[0], tuple(v.strip() for v in literal[1].split(',')))) == expected
+
+def test_clauses_are_transferred_once_per_forest():
+    compiled = compiled_mapping(mapping)
+    transfer.transfer(structured, compiled)
+    assert set(compiled.clauses) == {'movie(C,A), movie(C,B)', 'actor(A)', 'director(A)', 'actor(B)'}
+    compiled.clauses['actor(A)'] = 'student(memo)'
+    assert transfer.transfer(structured, compiled)[0][1]['true'] == 'student(memo)'
+
+def test_original_forest_is_not_changed():
+    before = repr(structured)
+    transfer.transfer(structured, mapping)
+    assert repr(structured) == before
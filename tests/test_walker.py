@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rembedding'))
+from rembedding import REmbedding
+
+settings = {'advisedby': ['person', 'person'], 'publication': ['title', 'person'], 'student': ['person']}
+dataset = [('advisedby', ['ann', 'bob']), ('advisedby', ['carl', 'bob']), ('publication', ['t1', 'ann']),
+           ('publication', ['t1', 'bob']), ('publication', ['t2', 'carl']), ('student', ['ann']), ('student', ['carl'])]
+
+def get_embedding():
+    embedding = REmbedding()
+    embedding.load_settings(settings)
+    embedding.load_dataset(dataset)
+    return embedding
+
+def get_steps(graph, walk):
+    '''(node, relation, node) triples of a walk'''
+    tokens = graph.sentence(walk)
+    return [(tokens[i], tokens[i+1], tokens[i+2]) for i in range(0, len(tokens) - 2, 2)]
+
+def test_walks_follow_edges_of_the_graph():
+    embedding = get_embedding()
+    graph = embedding.compile_graph()
+    edges = set((name, relation, str(node)) for name in embedding.graph.nodes for relation, node in embedding.graph.nodes[name].edges)
+    walks = graph.walk(200, 4, np.random.default_rng(0))
+    assert walks.shape == (200, 7)
+    for walk in walks:
+        for step in get_steps(graph, walk):
+            assert step in edges
+
+def test_walks_never_reuse_an_edge_in_either_direction():
+    embedding = get_embedding()
+    graph = embedding.compile_graph()
+    for walk in graph.walk(500, 6, np.random.default_rng(1)):
+        used = set()
+        for subject, relation, object_ in get_steps(graph, walk):
+            inverse = relation[1:] if relation[:1] == '_' else '_' + relation
+            assert (subject, relation, object_) not in used
+            used.add((subject, relation, object_))
+            used.add((object_, inverse, subject))
+
+def test_walks_are_reproducible_from_the_seed():
+    graph = get_embedding().compile_graph()
+    first = graph.walk(100, 5, np.random.default_rng(7))
+    second = graph.walk(100, 5, np.random.default_rng(7))
+    assert (first == second).all()
+    embedding = get_embedding()
+    assert (embedding.generate_walks(max_depth=5, n_sentences=100, seed=3) == embedding.generate_walks(max_depth=5, n_sentences=100, seed=3)).all()
+
+def test_corpus_passes_and_saved_corpus_are_the_same(tmp_path):
+    corpus = get_embedding().corpus(max_depth=4, n_sentences=50, seed=5)
+    sentences = list(corpus)
+    assert len(sentences) == 50
+    assert list(corpus) == sentences
+    corpus.save(str(tmp_path / 'walks.npy'))
+    assert [list(map(str, sentence)) for sentence in corpus] == [list(map(str, sentence)) for sentence in sentences]
@@ -9,6 +9,8 @@
 import copy
 import re
 
+from tboostsrl.schema import get_schema
+
 #transfer_map = ['workedunder(A, B) -> advisedby(B, A)',
 #            'director(A) -> professor(A)',
 #            'actor(A) -> student(A)',
@@ -48,7 +50,55 @@ import re
 #  {'': 'director(B), movie(C, A), movie(C, B)'},
 #  {'false': [0.0, 77, 0], 'true': [5.37e-08, 0, 77]}]]
 
+literal_re = re.compile('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)')
+
+class compiled_mapping(object):
+    '''Mapping strings compiled for transfer.
+    Each source predicate maps to a target predicate and a permutation,
+    where argument i of the target literal is argument permutation[i] of
+    the source literal. Transferred clauses are memoized, so a clause
+    repeated across the trees of a forest is only transferred once.'''
+
+    def __init__(self, mapping):
+        self.mapping = list(mapping)
+        self.predicates = {}
+        self.clauses = {}
+        for m in self.mapping:
+            match = literal_re.findall(m)
+            if match:
+                source_vars = [v.strip() for v in match[0][1].split(',')]
+                target_vars = [v.strip() for v in match[1][1].split(',')]
+                positions = dict((v, i) for i, v in enumerate(source_vars))
+                self.predicates[match[0][0]] = (match[1][0], tuple(positions[v] for v in target_vars))
+
+    def literal(self, literal):
+        '''Transfer a tokenized literal, None if its predicate is not mapped'''
+        if literal[0] in self.predicates:
+            name, permutation = self.predicates[literal[0]]
+            return (name, ', '.join(literal[1][i] for i in permutation))
+        return None
+
+    def clause(self, clause):
+        '''Transfer a clause string, literals of not mapped predicates are dropped'''
+        if clause not in self.clauses:
+            new_clause = []
+            for literal in transfer.tokenize(clause):
+                transfered = self.literal(literal)
+                if transfered:
+                    new_clause.append(transfer.literal_to_str(transfered))
+            self.clauses[clause] = ', '.join(new_clause)
+        return self.clauses[clause]
+
 class transfer:
+    # tokenized clauses, shared by every compiled mapping
+    tokens = {}
+
+    def tokenize(clause):
+        '''Split a clause into (predicate, arguments) literals'''
+        if clause not in transfer.tokens:
+            transfer.tokens[clause] = tuple((m[0], tuple(v.strip() for v in m[1].split(','))) for m in literal_re.findall(clause))
+        return transfer.tokens[clause]
+
     def literal_to_str(literal):
         '''Generate literal string from tuple'''
         return literal[0] + '(' + literal[1] + ')'
@@ -137,15 +187,16 @@ class transfer:
             children = value
             true_child = transfer.transfer_tree_helper(children[0], mapping_struct)
             false_child = transfer.transfer_tree_helper(children[1], mapping_struct)
-            match = re.findall('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)', node_str)
-            new_clause = []
-            if match:
-                for m in match:
+            if isinstance(mapping_struct, compiled_mapping):
+                new_key = mapping_struct.clause(node_str)
+            else:
+                new_clause = []
+                for m in literal_re.findall(node_str):
                     transfered = transfer.transfer_literal(m, mapping_struct)
                     if transfered:
                         new_clause.append(transfer.literal_to_str(transfered))
-            if len(new_clause):
                 new_key = ', '.join(new_clause)
+            if len(new_key):
                 return { new_key: [true_child, false_child] }
             else:
                 # nodes with no literals should be replaced by its false subtree
@@ -178,41 +229,23 @@ class transfer:
         return [target, nodes, leaves]
 
     def transfer(structured, mapping):
-        '''Transfer structure according to mapping'''
-        copied = copy.deepcopy(structured)
-        mapping_struct = transfer.get_mapping_struct(mapping)
-        for struct in copied:
-            match = re.match('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)', struct[0])
-            if match:
-                transfered = transfer.transfer_literal(match.groups(), mapping_struct)
-                if transfered:
-                    struct[0] = transfer.literal_to_str(transfered)
-                else:
-                    raise(Exception('Attempted to transfer head to a None mapping.'))
-            else:
-                 raise(Exception('Attempted to transfer head that does not exist.'))
-            # nodes with no literals should be replaced by its subtree
-            tree = transfer.get_transfer_tree(struct[1], struct[2])
-            transferred = transfer.transfer_tree(tree, mapping_struct)
-            new_struct = transfer.get_structured_from_transfer_tree(struct[0], transferred)
-    #        remove_nodes = []
-    #        new_nodes = {}
-    #        for key, value in struct[1].items():
-    #            if ','.join((key.split(','))[:-1]) not in remove_nodes:
-    #                match = re.findall('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)', value)
-    #                new_clause = []
-    #                if match:
-    #                    for m in match:
-    #                        transfered = transfer_literal(m, mapping_struct)
-    #                        if transfered:
-    #                            new_clause.append(literal_to_str(transfered))
-    #                if len(new_clause):
-    #                    #struct[1][key] = ', '.join(new_clause)
-    #                    new_nodes[key] = ', '.join(new_clause)
-    #                else:
-    #                    remove_nodes.append(key)
-            struct[1] = new_struct[1]
-            struct[2] = new_struct[2]
+        '''Transfer structure according to mapping
+        mapping is a list of mapping strings or a compiled_mapping, which can
+        be reused to transfer other forests'''
+        compiled = mapping if isinstance(mapping, compiled_mapping) else compiled_mapping(mapping)
+        copied = []
+        for struct in structured:
+            head = transfer.tokenize(struct[0])
+            if not len(head):
+                raise(Exception('Attempted to transfer head that does not exist.'))
+            transfered = compiled.literal(head[0])
+            if not transfered:
+                raise(Exception('Attempted to transfer head to a None mapping.'))
+            # nodes with no literals are replaced by its subtree
+            # trees are rebuilt from new dicts, only leaves need to be copied
+            tree = transfer.get_transfer_tree(struct[1], copy.deepcopy(struct[2]))
+            transferred = transfer.transfer_tree_helper(tree, compiled)
+            copied.append(transfer.get_structured_from_transfer_tree(transfer.literal_to_str(transfered), transferred))
         return copied
 
     def get_transferred_target(structured):
@@ -223,30 +256,14 @@ class transfer:
             return match.groups()[0]
 
     def get_transfer_file(source_bk, target_bk, from_pred, to_pred, recursion=False, searchArgPermutation=False, searchEmpty=False, allowSameTargetMap=False):
-        srcSet = set()
-        from_arity = 0
-        to_arity = 0
-        for pred in source_bk:
-            a = re.sub('[\+\-\`]', '', pred)
-            srcSet.add(a)
-            match = re.match('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)', a)
-            if match:
-                g = match.groups()
-                if g[0] == from_pred:
-                    from_arity = len(g[1].split(','))
-        tarSet = set()
-        for pred in target_bk:
-            a = re.sub('[\+\-\`]', '', pred)
-            tarSet.add(a)
-            match = re.match('([a-zA-Z_0-9]*)\s*\(([a-zA-Z_0-9,\s]*)\)', a)
-            if match:
-                g = match.groups()
-                if g[0] == to_pred:
-                    to_arity = len(g[1].split(','))
+        source_schema = get_schema(source_bk)
+        target_schema = get_schema(target_bk)
+        from_arity = source_schema.arity(from_pred)
+        to_arity = target_schema.arity(to_pred)
         tra = []
-        for item in srcSet:
+        for item in source_schema.transfer_declarations:
             tra.append('source: ' + item)
-        for item in tarSet:
+        for item in target_schema.transfer_declarations:
             tra.append('target: ' + item)
         tra.append('setMap: ' + from_pred + '(' + ','.join([chr(65+i) for i in range(from_arity)]) + ')=' + to_pred + '(' + ','.join([chr(65+i) for i in range(to_arity)]) + ').')
         if recursion: